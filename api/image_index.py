@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.image_fingerprint import BKTree, from_signed64
+from . import models
+
+# How often a request may trigger an incremental reload of new fingerprints
+REFRESH_SECONDS = float(os.getenv("IMAGE_INDEX_REFRESH_SECONDS", "60"))
+
+
+class ImageHashIndex:
+    """
+    In-memory BK-tree over the dHash of every message image in
+    raw.image_fingerprints, for near-duplicate lookups without a table scan.
+
+    Loaded once, then refreshed incrementally from rows whose loaded_at is
+    at or after the last seen one. An image whose hash changed stays in the
+    tree under its old hash but is filtered out against `_current`.
+    """
+
+    def __init__(self) -> None:
+        self._tree = BKTree()
+        # (channel_name, message_id) -> (dhash, content_hash)
+        self._current: Dict[Tuple[str, int], Tuple[int, str]] = {}
+        self._watermark = None
+        self._refreshed_at = 0.0
+        # _lock guards the tree and dict (lookups iterate the tree's child
+        # dicts); _refresh_lock keeps refreshes from reading the same rows twice
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self, db: Session) -> int:
+        """Add fingerprints loaded since the last refresh; returns how many were new or changed."""
+        with self._refresh_lock:
+            query = db.query(
+                models.ImageFingerprint.channel_name,
+                models.ImageFingerprint.message_id,
+                models.ImageFingerprint.dhash,
+                models.ImageFingerprint.content_hash,
+                models.ImageFingerprint.loaded_at,
+            )
+            if self._watermark is not None:
+                # >= so rows committed with the same timestamp are not missed
+                query = query.filter(models.ImageFingerprint.loaded_at >= self._watermark)
+
+            # Read outside _lock so lookups are only blocked while entries are added
+            rows = query.all()
+            added = 0
+            watermark = self._watermark
+            with self._lock:
+                for channel_name, message_id, dhash, content_hash, loaded_at in rows:
+                    key = (channel_name, message_id)
+                    entry = (from_signed64(dhash), content_hash)
+                    if self._current.get(key) != entry:
+                        self._current[key] = entry
+                        self._tree.add(entry[0], key)
+                        added += 1
+                    if watermark is None or loaded_at > watermark:
+                        watermark = loaded_at
+            self._watermark = watermark
+            self._refreshed_at = time.monotonic()
+            return added
+
+    def refresh_if_stale(self, db: Session, max_age: float = REFRESH_SECONDS) -> None:
+        if time.monotonic() - self._refreshed_at >= max_age:
+            self.refresh(db)
+
+    def similar(self, channel_name: str, message_id: int, max_distance: int,
+                limit: int) -> Optional[List[Tuple[int, str, int, bool]]]:
+        """
+        (distance, channel_name, message_id, exact_duplicate) of other images
+        within `max_distance` bits, nearest first; None if the image is unknown.
+        """
+        with self._lock:
+            entry = self._current.get((channel_name, message_id))
+            if entry is None:
+                return None
+            dhash, content_hash = entry
+            results = []
+            for distance, key_hash, key in self._tree.search(dhash, max_distance):
+                current = self._current.get(key)
+                if key == (channel_name, message_id) or current is None or current[0] != key_hash:
+                    continue
+                results.append((distance, key[0], key[1], current[1] == content_hash))
+                if len(results) >= limit:
+                    break
+            return results
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+
+image_index = ImageHashIndex()
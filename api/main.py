@@ -1,17 +1,38 @@
 from fastapi import FastAPI, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
-from typing import List
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import List, Optional
 from . import models, schemas
-from .database import engine, get_db
+from .database import engine, get_db, SessionLocal
+from .image_index import image_index
 
 # Create tables in the database (marts schema should already exist from dbt)
 # models.Base.metadata.create_all(bind=engine)
 
+def date_key(day: date) -> int:
+    """dim_dates key (yyyymmdd) for a date."""
+    return day.year * 10000 + day.month * 100 + day.day
+
+@asynccontextmanager
+async def lifespan(app):
+    # Build the similar-image index up front; requests refresh it incrementally
+    db = SessionLocal()
+    try:
+        image_index.refresh(db)
+    except Exception as e:
+        print(f"Image index not loaded at startup, will retry on first request: {e}")
+    finally:
+        db.close()
+    yield
+
 app = FastAPI(
     title="Medical Telegram Analytics API",
     description="API for querying analytical insights from the Telegram message data warehouse.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 @app.get("/")
@@ -22,13 +43,13 @@ async def root():
 def get_top_products(limit: int = 10, db: Session = Depends(get_db)):
     """
     Returns the most frequently mentioned terms/products across all channels 
-    based on YOLO detections.
+    based on YOLO detections, counting every detected object.
     """
     results = db.query(
-        models.ImageDetection.detected_class.label("product_name"),
-        func.count(models.ImageDetection.detected_class).label("mention_count")
+        models.ImageDetectionBox.detected_class.label("product_name"),
+        func.count(models.ImageDetectionBox.box_key).label("mention_count")
     ).group_by(
-        models.ImageDetection.detected_class
+        models.ImageDetectionBox.detected_class
     ).order_by(
         desc("mention_count")
     ).limit(limit).all()
@@ -36,22 +57,32 @@ def get_top_products(limit: int = 10, db: Session = Depends(get_db)):
     return results
 
 @app.get("/api/channels/{channel_name}/activity", response_model=List[schemas.ChannelActivity])
-def get_channel_activity(channel_name: str, db: Session = Depends(get_db)):
+def get_channel_activity(
+    channel_name: str,
+    start: Optional[date] = Query(None, description="First day to include (YYYY-MM-DD)"),
+    end: Optional[date] = Query(None, description="Last day to include (YYYY-MM-DD)"),
+    db: Session = Depends(get_db)
+):
     """
     Returns posting activity and trends for a specific channel.
+    Reads the pre-aggregated daily mart, optionally limited to a date range.
     """
-    results = db.query(
-        func.date(models.Message.message_datetime).label("date"),
-        func.count(models.Message.message_key).label("message_count"),
-        func.sum(models.Message.view_count).label("total_views"),
-        func.sum(models.Message.forward_count).label("total_forwards")
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+
+    query = db.query(
+        models.ChannelDailyActivity.activity_date.label("date"),
+        models.ChannelDailyActivity.message_count,
+        models.ChannelDailyActivity.total_views,
+        models.ChannelDailyActivity.total_forwards
     ).filter(
-        models.Message.channel_name == channel_name
-    ).group_by(
-        func.date(models.Message.message_datetime)
-    ).order_by(
-        func.date(models.Message.message_datetime)
-    ).all()
+        models.ChannelDailyActivity.channel_name == channel_name
+    )
+    if start is not None:
+        query = query.filter(models.ChannelDailyActivity.activity_date >= start)
+    if end is not None:
+        query = query.filter(models.ChannelDailyActivity.activity_date <= end)
+    results = query.order_by(models.ChannelDailyActivity.activity_date).all()
     
     if not results:
         raise HTTPException(status_code=404, detail="Channel not found or no activity recorded")
@@ -72,38 +103,98 @@ def search_messages(query: str = Query(..., min_length=1), limit: int = 20, db:
     return results
 
 @app.get("/api/reports/visual-content", response_model=List[schemas.VisualContentStats])
-def get_visual_content_stats(db: Session = Depends(get_db)):
+def get_visual_content_stats(
+    start: Optional[date] = Query(None, description="First day to include (YYYY-MM-DD)"),
+    end: Optional[date] = Query(None, description="Last day to include (YYYY-MM-DD)"),
+    db: Session = Depends(get_db)
+):
     """
     Returns statistics about image usage and top object detections across channels.
+    Computed in a single query: per-channel totals from the daily activity mart,
+    and each channel's top 3 detected classes ranked with ROW_NUMBER().
     """
-    # Get base message stats per channel
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+
+    # Message totals per channel
+    activity = models.ChannelDailyActivity
     channel_stats = db.query(
-        models.Message.channel_name,
-        func.count(models.Message.message_key).label("total_messages"),
-        func.count(models.Message.message_key).filter(models.Message.has_image == True).label("messages_with_images")
+        activity.channel_key,
+        activity.channel_name,
+        func.sum(activity.message_count).label("total_messages"),
+        func.sum(activity.image_count).label("messages_with_images")
+    )
+    if start is not None:
+        channel_stats = channel_stats.filter(activity.activity_date >= start)
+    if end is not None:
+        channel_stats = channel_stats.filter(activity.activity_date <= end)
+    channel_stats = channel_stats.group_by(activity.channel_key, activity.channel_name).subquery()
+
+    # Detections per channel and class, ranked within each channel
+    detection = models.ImageDetection
+    class_counts = db.query(
+        detection.channel_key,
+        detection.detected_class,
+        func.row_number().over(
+            partition_by=detection.channel_key,
+            order_by=(desc(func.count()), detection.detected_class)
+        ).label("class_rank")
+    )
+    if start is not None:
+        class_counts = class_counts.filter(detection.date_key >= date_key(start))
+    if end is not None:
+        class_counts = class_counts.filter(detection.date_key <= date_key(end))
+    class_counts = class_counts.group_by(detection.channel_key, detection.detected_class).subquery()
+
+    top_classes = db.query(
+        class_counts.c.channel_key,
+        func.array_agg(aggregate_order_by(class_counts.c.detected_class, class_counts.c.class_rank)).label("classes")
+    ).filter(
+        class_counts.c.class_rank <= 3
     ).group_by(
-        models.Message.channel_name
+        class_counts.c.channel_key
+    ).subquery()
+
+    results = db.query(
+        channel_stats.c.channel_name,
+        channel_stats.c.total_messages,
+        channel_stats.c.messages_with_images,
+        top_classes.c.classes
+    ).outerjoin(
+        top_classes, top_classes.c.channel_key == channel_stats.c.channel_key
+    ).order_by(
+        channel_stats.c.channel_name
     ).all()
-    
-    final_stats = []
-    for stat in channel_stats:
-        # Get top 3 detected classes for this channel
-        top_classes = db.query(
-            models.ImageDetection.detected_class
-        ).filter(
-            models.ImageDetection.channel_key == db.query(models.Channel.channel_key).filter(models.Channel.channel_name == stat.channel_name).scalar_subquery()
-        ).group_by(
-            models.ImageDetection.detected_class
-        ).order_by(
-            desc(func.count(models.ImageDetection.detected_class))
-        ).limit(3).all()
-        
-        final_stats.append({
+
+    return [
+        {
             "channel_name": stat.channel_name,
             "total_messages": stat.total_messages,
             "messages_with_images": stat.messages_with_images,
             "image_percentage": (stat.messages_with_images / stat.total_messages * 100) if stat.total_messages > 0 else 0,
-            "top_detected_classes": [c[0] for c in top_classes]
-        })
-        
-    return final_stats
+            "top_detected_classes": stat.classes or []
+        }
+        for stat in results
+    ]
+
+@app.get("/api/images/{channel_name}/{message_id}/similar", response_model=List[schemas.SimilarImage])
+def get_similar_images(
+    channel_name: str,
+    message_id: int,
+    max_distance: int = Query(6, ge=0, le=16),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """
+    Returns posts across channels whose image is a near duplicate of this
+    message's image (dHash Hamming distance up to `max_distance` bits).
+    """
+    image_index.refresh_if_stale(db)
+    results = image_index.similar(channel_name, message_id, max_distance, limit)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Image not found for this message")
+
+    return [
+        {"channel_name": channel, "message_id": similar_id, "distance": distance, "exact_duplicate": exact}
+        for distance, channel, similar_id, exact in results
+    ]
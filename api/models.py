@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Date, ForeignKey, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Float, DateTime, Date, ForeignKey, Text
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -6,7 +6,7 @@ class Channel(Base):
     __tablename__ = "dim_channels"
     __table_args__ = {"schema": "public_marts"}
 
-    channel_key = Column(String, primary_key=True, index=True)
+    channel_key = Column(BigInteger, primary_key=True, index=True)
     channel_name = Column(String, unique=True, index=True, nullable=False)
     channel_type = Column(String)
     first_post_date = Column(Date)
@@ -40,10 +40,10 @@ class Message(Base):
     __tablename__ = "fct_messages"
     __table_args__ = {"schema": "public_marts"}
 
-    message_key = Column(String, primary_key=True, index=True)
+    message_key = Column(BigInteger, primary_key=True, index=True)
     message_id = Column(Integer)
     channel_name = Column(String)
-    channel_key = Column(String, ForeignKey("public_marts.dim_channels.channel_key"))
+    channel_key = Column(BigInteger, ForeignKey("public_marts.dim_channels.channel_key"))
     date_key = Column(Integer, ForeignKey("public_marts.dim_dates.date_key"))
     message_text = Column(Text)
     message_length = Column(Integer)
@@ -62,6 +62,11 @@ class Message(Base):
         back_populates="message",
         primaryjoin="Message.message_key == ImageDetection.message_key"
     )
+    detection_boxes = relationship(
+        "ImageDetectionBox",
+        back_populates="message",
+        primaryjoin="Message.message_key == ImageDetectionBox.message_key"
+    )
 
 class ImageDetection(Base):
     __tablename__ = "fct_image_detections"
@@ -74,10 +79,10 @@ class ImageDetection(Base):
     
     # For now, let's treat message_key + detected_class as a primary key or just add an ID if possible.
     # If dbt doesn't have a PK, I might have to use a composite one.
-    message_key = Column(String, ForeignKey("public_marts.fct_messages.message_key"), primary_key=True)
+    message_key = Column(BigInteger, ForeignKey("public_marts.fct_messages.message_key"), primary_key=True)
     detected_class = Column(String, primary_key=True)
     message_id = Column(Integer)
-    channel_key = Column(String)
+    channel_key = Column(BigInteger)
     date_key = Column(Integer)
     confidence_score = Column(Float)
     image_category = Column(String)
@@ -87,3 +92,56 @@ class ImageDetection(Base):
         back_populates="detections",
         primaryjoin="ImageDetection.message_key == Message.message_key"
     )
+
+class ImageDetectionBox(Base):
+    __tablename__ = "fct_image_detection_boxes"
+    __table_args__ = {"schema": "public_marts"}
+
+    # One row per detected object; box_key is unique per (message, box_index)
+    box_key = Column(String, primary_key=True)
+    message_key = Column(BigInteger, ForeignKey("public_marts.fct_messages.message_key"))
+    message_id = Column(Integer)
+    channel_key = Column(BigInteger)
+    date_key = Column(Integer)
+    box_index = Column(Integer)
+    detected_class = Column(String)
+    confidence_score = Column(Float)
+    x1 = Column(Float)
+    y1 = Column(Float)
+    x2 = Column(Float)
+    y2 = Column(Float)
+    box_area = Column(Float)
+
+    message = relationship(
+        "Message",
+        back_populates="detection_boxes",
+        primaryjoin="ImageDetectionBox.message_key == Message.message_key"
+    )
+
+class ChannelDailyActivity(Base):
+    __tablename__ = "agg_channel_daily_activity"
+    __table_args__ = {"schema": "public_marts"}
+
+    channel_key = Column(BigInteger, ForeignKey("public_marts.dim_channels.channel_key"), primary_key=True)
+    date_key = Column(Integer, ForeignKey("public_marts.dim_dates.date_key"), primary_key=True)
+    channel_name = Column(String, index=True)
+    activity_date = Column(Date)
+    message_count = Column(Integer)
+    total_views = Column(BigInteger)
+    total_forwards = Column(BigInteger)
+    image_count = Column(Integer)
+
+class ImageFingerprint(Base):
+    # Read from the raw layer so the similar-image index sees new images
+    # as soon as scripts/load_image_fingerprints.py has run
+    __tablename__ = "image_fingerprints"
+    __table_args__ = {"schema": "raw"}
+
+    channel_name = Column(String, primary_key=True)
+    message_id = Column(Integer, primary_key=True)
+    content_hash = Column(String, nullable=False)
+    dhash = Column(BigInteger, nullable=False)
+    width = Column(Integer)
+    height = Column(Integer)
+    canonical_hash = Column(String)
+    loaded_at = Column(DateTime)
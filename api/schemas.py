@@ -39,3 +39,9 @@ class VisualContentStats(BaseModel):
 
     class Config:
         orm_mode = True
+
+class SimilarImage(BaseModel):
+    channel_name: str
+    message_id: int
+    distance: int
+    exact_duplicate: bool
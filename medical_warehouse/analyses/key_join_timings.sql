@@ -0,0 +1,27 @@
+-- Join timings for the mart surrogate keys
+-- Compile with `dbt compile` and run the statements in
+-- target/compiled/medical_warehouse/analyses/ under EXPLAIN (ANALYZE, BUFFERS)
+-- on a build made before and after switching keys (MD5 text/uuid to
+-- bigint/yyyymmdd integer), to compare execution times and table sizes.
+
+-- Detections to messages, as in fct_image_detections
+SELECT COUNT(*), COUNT(DISTINCT m.channel_key)
+FROM {{ ref('fct_image_detections') }} d
+JOIN {{ ref('fct_messages') }} m ON d.message_key = m.message_key;
+
+-- Messages to dates, as in the channel activity endpoint
+SELECT DATE_TRUNC('month', dd.full_date) AS month, COUNT(*)
+FROM {{ ref('fct_messages') }} m
+JOIN {{ ref('dim_dates') }} dd ON m.date_key = dd.date_key
+GROUP BY 1;
+
+-- Messages to channels
+SELECT c.channel_name, COUNT(*)
+FROM {{ ref('fct_messages') }} m
+JOIN {{ ref('dim_channels') }} c ON m.channel_key = c.channel_key
+GROUP BY 1;
+
+-- Key width
+SELECT
+    pg_size_pretty(pg_total_relation_size('{{ ref('fct_messages') }}')) AS fct_messages_size,
+    pg_size_pretty(pg_total_relation_size('{{ ref('fct_image_detections') }}')) AS fct_image_detections_size;
@@ -0,0 +1,31 @@
+-- Post-hook for incremental models. dbt-postgres creates a model's native
+-- `indexes` config only when it builds the table from scratch, so an index
+-- added to the config of an existing incremental table would otherwise
+-- need a --full-refresh. This creates any configured index that has no
+-- counterpart on the table with the same method, uniqueness and columns.
+-- Table models rebuild (and so re-index) every run and are skipped.
+{% macro add_missing_indexes() %}
+    {%- set indexes = config.get('indexes', []) -%}
+    {%- if execute and indexes and config.get('materialized') == 'incremental' -%}
+        {%- set existing = run_query(
+            "SELECT am.amname || ':' || ix.indisunique::text || ':'
+                    || string_agg(a.attname, ',' ORDER BY k.ord)
+             FROM pg_index ix
+             JOIN pg_class t ON t.oid = ix.indrelid
+             JOIN pg_namespace n ON n.oid = t.relnamespace
+             JOIN pg_class i ON i.oid = ix.indexrelid
+             JOIN pg_am am ON am.oid = i.relam
+             CROSS JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k (attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+             WHERE n.nspname = '" ~ this.schema ~ "' AND t.relname = '" ~ this.identifier ~ "'
+             GROUP BY ix.indexrelid, am.amname, ix.indisunique"
+        ).columns[0].values() -%}
+        {%- for index in indexes -%}
+            {%- set signature = index.get('type', 'btree') ~ ':' ~ (index.get('unique', false) | string | lower)
+                ~ ':' ~ index['columns'] | join(',') -%}
+            {%- if signature not in existing %}
+    {{ get_create_index_sql(this, index) }};
+            {%- endif -%}
+        {%- endfor -%}
+    {%- endif -%}
+{% endmacro %}
@@ -0,0 +1,5 @@
+-- Latest loaded_at already in an incremental model: the next batch is
+-- everything loaded after it
+{% macro loaded_at_watermark(column='loaded_at') %}
+    (SELECT COALESCE(MAX(existing.{{ column }}), '1900-01-01'::timestamp) FROM {{ this }} AS existing)
+{% endmacro %}
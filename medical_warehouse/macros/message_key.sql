@@ -0,0 +1,5 @@
+-- Compact bigint key for a message: channel_key in the high 32 bits,
+-- the (32-bit) Telegram message_id in the low 32 bits
+{% macro message_key(channel_key, message_id) %}
+    (({{ channel_key }}::bigint << 32) | {{ message_id }}::bigint)
+{% endmacro %}
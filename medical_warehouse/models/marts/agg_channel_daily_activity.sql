@@ -0,0 +1,58 @@
+-- Daily posting activity per channel, pre-aggregated for the activity endpoint
+-- Incremental: only the (channel, day) pairs with messages loaded since the
+-- last run are recomputed, from all of that day's messages
+
+{{ config(
+    materialized='incremental',
+    unique_key=['channel_key', 'date_key'],
+    indexes=[
+        {'columns': ['channel_key', 'date_key'], 'unique': True},
+        {'columns': ['channel_name', 'activity_date']},
+        {'columns': ['loaded_at']}
+    ]
+) }}
+
+WITH messages AS (
+    SELECT * FROM {{ ref('fct_messages') }}
+),
+
+{% if is_incremental() %}
+changed_days AS (
+    SELECT DISTINCT channel_name, DATE(message_datetime) AS activity_date
+    FROM messages
+    WHERE loaded_at > {{ loaded_at_watermark() }}
+),
+{% endif %}
+
+daily AS (
+    SELECT
+        m.channel_key,
+        m.channel_name,
+        DATE(m.message_datetime) AS activity_date,
+        COUNT(*) AS message_count,
+        SUM(m.view_count) AS total_views,
+        SUM(m.forward_count) AS total_forwards,
+        COUNT(*) FILTER (WHERE m.has_image) AS image_count,
+        MAX(m.loaded_at) AS loaded_at
+    FROM messages m
+    {% if is_incremental() %}
+    -- Range on message_datetime so each day is an index range read
+    JOIN changed_days c
+      ON m.channel_name = c.channel_name
+     AND m.message_datetime >= c.activity_date
+     AND m.message_datetime < c.activity_date + 1
+    {% endif %}
+    GROUP BY m.channel_key, m.channel_name, DATE(m.message_datetime)
+)
+
+SELECT
+    channel_key,
+    TO_CHAR(activity_date, 'YYYYMMDD')::integer AS date_key,
+    channel_name,
+    activity_date,
+    message_count,
+    total_views,
+    total_forwards,
+    image_count,
+    loaded_at
+FROM daily
@@ -1,15 +1,42 @@
 -- Dimension table for Telegram channels
 -- Contains channel metadata and aggregated metrics
+-- Incremental: only channels with messages loaded since the last run are recomputed
 
-WITH channel_stats AS (
+{{ config(
+    materialized='incremental',
+    unique_key='channel_key',
+    indexes=[
+        {'columns': ['channel_key'], 'unique': True},
+        {'columns': ['channel_name'], 'unique': True}
+    ]
+) }}
+
+WITH messages AS (
+    SELECT * FROM {{ ref('stg_telegram_messages') }}
+),
+
+{% if is_incremental() %}
+batch_channels AS (
+    SELECT DISTINCT channel_name
+    FROM messages
+    WHERE loaded_at > {{ loaded_at_watermark() }}
+),
+{% endif %}
+
+channel_stats AS (
     SELECT
         channel_name,
+        channel_key,
         MIN(message_date) AS first_post_date,
         MAX(message_date) AS last_post_date,
         COUNT(*) AS total_posts,
-        ROUND(AVG(view_count), 2) AS avg_views
-    FROM {{ ref('stg_telegram_messages') }}
-    GROUP BY channel_name
+        ROUND(AVG(view_count), 2) AS avg_views,
+        MAX(loaded_at) AS loaded_at
+    FROM messages
+    {% if is_incremental() %}
+    WHERE channel_name IN (SELECT channel_name FROM batch_channels)
+    {% endif %}
+    GROUP BY channel_name, channel_key
 ),
 
 channel_classification AS (
@@ -24,12 +51,13 @@ channel_classification AS (
 )
 
 SELECT
-    MD5(cs.channel_name)::uuid AS channel_key,
+    cs.channel_key,
     cs.channel_name,
     cc.channel_type,
     cs.first_post_date,
     cs.last_post_date,
     cs.total_posts,
-    cs.avg_views
+    cs.avg_views,
+    cs.loaded_at
 FROM channel_stats cs
 LEFT JOIN channel_classification cc ON cs.channel_name = cc.channel_name
@@ -1,7 +1,13 @@
 -- Date dimension table for time-based analysis
 -- Generates a complete date dimension from the earliest to latest message dates
 
-{{ config(materialized='table') }}
+{{ config(
+    materialized='table',
+    indexes=[
+        {'columns': ['date_key'], 'unique': True},
+        {'columns': ['full_date'], 'unique': True}
+    ]
+) }}
 
 WITH date_range AS (
     SELECT
@@ -15,7 +21,7 @@ WITH date_range AS (
 date_details AS (
     SELECT
         date_day AS full_date,
-        MD5(date_day::text)::uuid AS date_key,
+        TO_CHAR(date_day, 'YYYYMMDD')::integer AS date_key,
         EXTRACT(DAY FROM date_day)::integer AS day_of_month,
         EXTRACT(DOW FROM date_day)::integer AS day_of_week,
         TO_CHAR(date_day, 'Day') AS day_name,
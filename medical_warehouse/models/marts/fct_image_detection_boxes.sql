@@ -0,0 +1,35 @@
+-- Fact table for individual detected objects
+-- Joins per-box YOLO detections with messages to get channel and date keys
+
+{{ config(
+    indexes=[
+        {'columns': ['box_key'], 'unique': True},
+        {'columns': ['message_key']},
+        {'columns': ['detected_class']}
+    ]
+) }}
+
+WITH boxes AS (
+    SELECT * FROM {{ ref('stg_yolo_detection_boxes') }}
+),
+
+messages AS (
+    SELECT * FROM {{ ref('fct_messages') }}
+)
+
+SELECT
+    b.box_key,
+    b.message_key,
+    b.message_id,
+    m.channel_key,
+    m.date_key,
+    b.box_index,
+    b.detected_class,
+    b.confidence_score,
+    b.x1,
+    b.y1,
+    b.x2,
+    b.y2,
+    b.box_area
+FROM boxes b
+JOIN messages m ON b.message_key = m.message_key
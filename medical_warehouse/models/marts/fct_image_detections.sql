@@ -1,5 +1,18 @@
 -- Fact table for image detections
 -- Joins YOLO detections with messages to get channel and date keys
+-- Incremental: picks up detections loaded since the last run, and older
+-- detections whose message only just reached fct_messages
+
+{{ config(
+    materialized='incremental',
+    unique_key='message_key',
+    indexes=[
+        {'columns': ['message_key'], 'unique': True},
+        {'columns': ['channel_key']},
+        {'columns': ['detected_class']},
+        {'columns': ['loaded_at']}
+    ]
+) }}
 
 WITH detections AS (
     SELECT * FROM {{ ref('stg_yolo_detections') }}
@@ -16,6 +29,11 @@ SELECT
     m.date_key,
     d.detected_class,
     d.confidence_score,
-    d.image_category
+    d.image_category,
+    GREATEST(d.loaded_at, m.loaded_at) AS loaded_at
 FROM detections d
 JOIN messages m ON d.message_key = m.message_key
+{% if is_incremental() %}
+WHERE d.loaded_at > {{ loaded_at_watermark() }}
+   OR m.loaded_at > {{ loaded_at_watermark() }}
+{% endif %}
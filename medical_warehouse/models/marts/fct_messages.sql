@@ -1,12 +1,25 @@
 -- Fact table for telegram messages
 -- Links messages to dimension tables
+-- Incremental: only messages loaded (inserted or changed) since the last run are merged
+
+{{ config(
+    materialized='incremental',
+    unique_key='message_key',
+    indexes=[
+        {'columns': ['message_key'], 'unique': True},
+        {'columns': ['channel_name', 'message_datetime']},
+        {'columns': ['channel_key']},
+        {'columns': ['date_key']},
+        {'columns': ['message_datetime'], 'type': 'brin'},
+        {'columns': ['loaded_at']}
+    ]
+) }}
 
 WITH messages AS (
     SELECT * FROM {{ ref('stg_telegram_messages') }}
-),
-
-channels AS (
-    SELECT * FROM {{ ref('dim_channels') }}
+    {% if is_incremental() %}
+    WHERE loaded_at > {{ loaded_at_watermark() }}
+    {% endif %}
 ),
 
 dates AS (
@@ -20,7 +33,7 @@ SELECT
     m.channel_name,
     
     -- Foreign keys
-    c.channel_key,
+    m.channel_key,
     d.date_key,
     
     -- Message attributes
@@ -31,8 +44,8 @@ SELECT
     m.has_image,
     
     -- Timestamps
-    m.message_datetime
+    m.message_datetime,
+    m.loaded_at
     
 FROM messages m
-LEFT JOIN channels c ON m.channel_name = c.channel_name
 LEFT JOIN dates d ON m.message_date = d.full_date
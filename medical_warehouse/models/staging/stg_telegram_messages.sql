@@ -5,12 +5,23 @@ WITH source AS (
     SELECT * FROM {{ source('raw', 'telegram_messages') }}
 ),
 
+channels AS (
+    SELECT channel_name, channel_key FROM {{ source('raw', 'channel_registry') }}
+),
+
+keyed AS (
+    SELECT source.*, channels.channel_key
+    FROM source
+    LEFT JOIN channels USING (channel_name)
+),
+
 cleaned AS (
     SELECT
         -- Primary keys
-        {{ dbt_utils.generate_surrogate_key(['message_id', 'channel_name']) }} AS message_key,
+        {{ message_key('channel_key', 'message_id') }} AS message_key,
         message_id,
         channel_name,
+        channel_key,
         
         -- Dates
         CAST(message_date AS TIMESTAMP) AS message_datetime,
@@ -39,7 +50,7 @@ cleaned AS (
         -- Metadata
         loaded_at
         
-    FROM source
+    FROM keyed
     
     -- Filter out invalid records
     WHERE message_id IS NOT NULL
@@ -0,0 +1,37 @@
+-- Staging model for per-box YOLO detections
+-- One row per detected object with its bounding box
+
+WITH source AS (
+    SELECT * FROM {{ source('raw', 'yolo_detection_boxes') }}
+),
+
+channels AS (
+    SELECT channel_name, channel_key FROM {{ source('raw', 'channel_registry') }}
+),
+
+keyed AS (
+    SELECT source.*, channels.channel_key
+    FROM source
+    LEFT JOIN channels USING (channel_name)
+),
+
+cleaned AS (
+    SELECT
+        {{ dbt_utils.generate_surrogate_key(['message_id', 'channel_name', 'box_index']) }} AS box_key,
+        {{ message_key('channel_key', 'message_id') }} AS message_key,
+        message_id,
+        channel_name,
+        box_index,
+        detected_class,
+        CAST(confidence_score AS FLOAT) AS confidence_score,
+        x1,
+        y1,
+        x2,
+        y2,
+        (x2 - x1) * (y2 - y1) AS box_area,
+        loaded_at
+    FROM keyed
+    WHERE message_id IS NOT NULL
+)
+
+SELECT * FROM cleaned
@@ -5,16 +5,26 @@ WITH source AS (
     SELECT * FROM {{ source('raw', 'yolo_detections') }}
 ),
 
+channels AS (
+    SELECT channel_name, channel_key FROM {{ source('raw', 'channel_registry') }}
+),
+
+keyed AS (
+    SELECT source.*, channels.channel_key
+    FROM source
+    LEFT JOIN channels USING (channel_name)
+),
+
 cleaned AS (
     SELECT
-        {{ dbt_utils.generate_surrogate_key(['message_id', 'channel_name']) }} AS message_key,
+        {{ message_key('channel_key', 'message_id') }} AS message_key,
         message_id,
         channel_name,
         detected_class,
         CAST(confidence_score AS FLOAT) AS confidence_score,
         image_category,
         loaded_at
-    FROM source
+    FROM keyed
     WHERE message_id IS NOT NULL
 )
 
@@ -2,12 +2,15 @@ import os
 import subprocess
 from dagster import op, job, schedule, DefaultScheduleStatus, RunRequest
 
+from src import detection_client
+
 # Constants
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SCRAPER_SCRIPT = os.path.join(BASE_DIR, "src", "scraper.py")
 LOADER_SCRIPT = os.path.join(BASE_DIR, "scripts", "load_to_postgres.py")
 YOLO_SCRIPT = os.path.join(BASE_DIR, "src", "yolo_detect.py")
 YOLO_LOADER_SCRIPT = os.path.join(BASE_DIR, "scripts", "load_yolo_to_postgres.py")
+FINGERPRINT_LOADER_SCRIPT = os.path.join(BASE_DIR, "scripts", "load_image_fingerprints.py")
 DBT_PROJECT_DIR = os.path.join(BASE_DIR, "medical_warehouse")
 
 @op
@@ -29,17 +32,27 @@ def load_raw_to_postgres(scraper_output):
 @op
 def run_yolo_enrichment(scraper_output):
     """Runs YOLO object detection and loads results into PostgreSQL."""
-    # Run detection
-    detect_result = subprocess.run(["python", YOLO_SCRIPT], capture_output=True, text=True)
-    if detect_result.returncode != 0:
-        raise Exception(f"YOLO detection failed: {detect_result.stderr}")
+    # Run detection, on the warm detection service when one is running
+    if detection_client.service_health() is not None:
+        response = detection_client.run_detection()
+        detect_output = f"Detection service ({response['model_version']}) wrote {response['rows']} rows to {response['output_csv']}"
+    else:
+        detect_result = subprocess.run(["python", YOLO_SCRIPT], capture_output=True, text=True)
+        if detect_result.returncode != 0:
+            raise Exception(f"YOLO detection failed: {detect_result.stderr}")
+        detect_output = detect_result.stdout
     
     # Load detection results
     load_result = subprocess.run(["python", YOLO_LOADER_SCRIPT], capture_output=True, text=True)
     if load_result.returncode != 0:
         raise Exception(f"YOLO loader failed: {load_result.stderr}")
+
+    # Load image fingerprints for the similar-image endpoint
+    fingerprint_result = subprocess.run(["python", FINGERPRINT_LOADER_SCRIPT], capture_output=True, text=True)
+    if fingerprint_result.returncode != 0:
+        raise Exception(f"Fingerprint loader failed: {fingerprint_result.stderr}")
     
-    return f"{detect_result.stdout}\n{load_result.stdout}"
+    return f"{detect_output}\n{load_result.stdout}\n{fingerprint_result.stdout}"
 
 @op
 def run_dbt_transformations(load_raw_output, yolo_output):
@@ -0,0 +1,58 @@
+"""
+Script to compact the raw data lake.
+Merges the daily <date>/<channel> message partitions of a month into one
+Parquet file per channel under data/raw/telegram_messages/monthly/<YYYY-MM>/.
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime, timezone
+
+# Paths
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BASE_PATH)
+from src import datalake  # noqa: E402
+
+
+def completed_months():
+    """Months that have daily partitions and are fully in the past."""
+    current_month = datetime.now(timezone.utc).strftime("%Y-%m")
+    messages_dir = datalake.telegram_messages_dir(BASE_PATH)
+    if not os.path.isdir(messages_dir):
+        return []
+    months = {
+        name[:7]
+        for name in os.listdir(messages_dir)
+        if len(name) == 10 and name[4] == "-" and name[7] == "-"
+    }
+    return sorted(m for m in months if m < current_month)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact daily lake partitions into monthly Parquet files.")
+    parser.add_argument("--month", action="append", help="Month to compact (YYYY-MM); defaults to every completed month")
+    parser.add_argument("--channel", help="Only compact this channel")
+    parser.add_argument("--keep-source", action="store_true", help="Keep the daily files after compaction")
+    args = parser.parse_args()
+
+    months = args.month or completed_months()
+    if not months:
+        print("Nothing to compact")
+        return
+
+    for month in months:
+        written = datalake.compact_month(
+            base_path=BASE_PATH,
+            month_str=month,
+            channel_name=args.channel,
+            delete_source=not args.keep_source,
+        )
+        print(f"{month}: wrote {len(written)} compacted file(s)")
+        for path in written:
+            print(f"  {os.path.relpath(path, BASE_PATH)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Script to load image fingerprints (content hash + dHash per message image)
+from the local fingerprint store into PostgreSQL, for the API's
+similar-image lookup. Only mappings recorded since the last load are read.
+"""
+
+import io
+import os
+import sys
+import sqlite3
+import argparse
+from dotenv import load_dotenv
+import psycopg2
+
+load_dotenv()
+
+# Database configuration
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
+DB_NAME = os.getenv("DB_NAME", "medical_warehouse")
+
+# Paths
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BASE_PATH)
+from src import datalake, image_fingerprint  # noqa: E402
+
+FINGERPRINT_COLUMNS = [
+    'channel_name', 'message_id', 'content_hash', 'dhash', 'width', 'height', 'canonical_hash', 'source_created_at'
+]
+CHUNK_ROWS = 50000
+
+
+def get_connection():
+    return psycopg2.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME
+    )
+
+
+def create_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("CREATE SCHEMA IF NOT EXISTS raw;")
+        # dhash is the unsigned 64-bit hash stored in signed BIGINT range
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS raw.image_fingerprints (
+                channel_name VARCHAR(255),
+                message_id INTEGER,
+                content_hash CHAR(64) NOT NULL,
+                dhash BIGINT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                canonical_hash CHAR(64),
+                source_created_at TEXT,
+                loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (channel_name, message_id)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS image_fingerprints_loaded_at
+            ON raw.image_fingerprints (loaded_at);
+        """)
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS image_fingerprints_stage (
+                LIKE raw.image_fingerprints INCLUDING DEFAULTS
+            ) ON COMMIT DELETE ROWS;
+        """)
+        conn.commit()
+
+
+def last_loaded_watermark(cur):
+    cur.execute("SELECT MAX(source_created_at) FROM raw.image_fingerprints")
+    return cur.fetchone()[0]
+
+
+def iter_store_rows(store_path, since=None, chunk_rows=CHUNK_ROWS):
+    """Yield chunks of (channel, message, hash, dhash, ...) rows recorded at or after `since`."""
+    conn = sqlite3.connect(store_path)
+    try:
+        cursor = conn.execute(
+            "SELECT m.channel_name, m.message_id, m.content_hash, f.dhash, f.width, f.height, "
+            "f.canonical_hash, m.created_at "
+            "FROM image_messages m JOIN fingerprints f USING (content_hash) "
+            "WHERE ? IS NULL OR m.created_at >= ? ORDER BY m.created_at",
+            (since, since),
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield rows
+    finally:
+        conn.close()
+
+
+def upsert_chunk(cur, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(str(value) for value in row) + "\n")
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY image_fingerprints_stage ({', '.join(FINGERPRINT_COLUMNS)}) FROM STDIN",
+        buffer,
+    )
+    # Unchanged rows keep their loaded_at, so the API's incremental refresh stays small
+    cur.execute(f"""
+        INSERT INTO raw.image_fingerprints ({', '.join(FINGERPRINT_COLUMNS)})
+        SELECT DISTINCT ON (channel_name, message_id) {', '.join(FINGERPRINT_COLUMNS)}
+        FROM image_fingerprints_stage
+        ORDER BY channel_name, message_id, source_created_at DESC
+        ON CONFLICT (channel_name, message_id) DO UPDATE SET
+            content_hash = EXCLUDED.content_hash,
+            dhash = EXCLUDED.dhash,
+            width = EXCLUDED.width,
+            height = EXCLUDED.height,
+            canonical_hash = EXCLUDED.canonical_hash,
+            source_created_at = EXCLUDED.source_created_at,
+            loaded_at = CURRENT_TIMESTAMP
+        WHERE raw.image_fingerprints.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+           OR raw.image_fingerprints.canonical_hash IS DISTINCT FROM EXCLUDED.canonical_hash;
+    """)
+    return cur.rowcount
+
+
+def load_fingerprints(conn, store_path, full_refresh=False):
+    if not os.path.exists(store_path):
+        print(f"Fingerprint store not found: {store_path}")
+        return 0
+    total = 0
+    with conn.cursor() as cur:
+        since = None if full_refresh else last_loaded_watermark(cur)
+        for rows in iter_store_rows(store_path, since):
+            total += upsert_chunk(cur, rows)
+            conn.commit()
+    print(f"Loaded {total} new/changed image fingerprints into raw.image_fingerprints")
+    return total
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load image fingerprints into PostgreSQL.")
+    parser.add_argument("--scan", action="store_true", help="First fingerprint images not yet in the store")
+    parser.add_argument("--full-refresh", action="store_true", help="Reload every mapping, not only new ones")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store_path = datalake.image_fingerprints_path(BASE_PATH)
+    if args.scan:
+        image_fingerprint.backfill(datalake.telegram_images_dir(BASE_PATH))
+    try:
+        conn = get_connection()
+        create_table(conn)
+        load_fingerprints(conn, store_path, full_refresh=args.full_refresh)
+        conn.close()
+    except Exception as e:
+        print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
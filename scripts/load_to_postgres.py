@@ -1,12 +1,20 @@
 """
 Script to load raw Telegram messages from JSON files into PostgreSQL.
 Creates the raw schema and raw.telegram_messages table, then loads all JSON data.
+Both legacy `.json` partitions and streamed `.jsonl[.gz|.zst]` partitions are read.
 """
 
+import io
 import os
+import sys
 import json
-import glob
-from datetime import datetime
+import queue
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime, timedelta, timezone
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2.extras import execute_values
@@ -24,6 +32,22 @@ DB_NAME = os.getenv("DB_NAME", "medical_warehouse")
 BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_PATH = os.path.join(BASE_PATH, "data", "raw", "telegram_messages")
 
+sys.path.insert(0, BASE_PATH)
+from src import datalake  # noqa: E402
+
+MESSAGE_COLUMNS = (
+    "message_id",
+    "channel_name",
+    "message_date",
+    "message_text",
+    "has_media",
+    "image_path",
+    "views",
+    "forwards",
+)
+# Staged rows also carry when they were scraped and a hash of their values
+STAGE_COLUMNS = MESSAGE_COLUMNS + ("scraped_at", "row_hash")
+
 
 def get_connection():
     """Create and return a database connection."""
@@ -42,7 +66,17 @@ def create_schema_and_table(conn):
         # Create schema
         cur.execute("CREATE SCHEMA IF NOT EXISTS raw;")
         
-        # Create table
+        # Tables from before partitioning are moved into the partitioned layout
+        cur.execute("SELECT to_regclass('raw.telegram_messages')::text, "
+                    "(SELECT relkind FROM pg_class WHERE oid = to_regclass('raw.telegram_messages'))")
+        exists, relkind = cur.fetchone()
+        if exists and relkind == 'r':
+            cur.execute("ALTER TABLE raw.telegram_messages ADD COLUMN IF NOT EXISTS row_hash TEXT;")
+            cur.execute("ALTER TABLE raw.telegram_messages RENAME TO telegram_messages_unpartitioned;")
+            cur.execute("ALTER INDEX raw.telegram_messages_pkey RENAME TO telegram_messages_unpartitioned_pkey;")
+        
+        # Create table, range partitioned by month of message_date. The
+        # partition key has to be part of the primary key.
         cur.execute("""
             CREATE TABLE IF NOT EXISTS raw.telegram_messages (
                 message_id INTEGER,
@@ -54,7 +88,63 @@ def create_schema_and_table(conn):
                 views INTEGER,
                 forwards INTEGER,
                 loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (message_id, channel_name)
+                row_hash TEXT,
+                PRIMARY KEY (message_id, channel_name, message_date)
+            ) PARTITION BY RANGE (message_date);
+        """)
+        # Catches messages whose month has no partition yet
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS raw.telegram_messages_default
+            PARTITION OF raw.telegram_messages DEFAULT;
+        """)
+        # Incremental dbt models select by loaded_at; the API filters channels by date
+        cur.execute("CREATE INDEX IF NOT EXISTS telegram_messages_loaded_at ON raw.telegram_messages (loaded_at);")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS telegram_messages_channel_date
+            ON raw.telegram_messages (channel_name, message_date);
+        """)
+        
+        if exists and relkind == 'r':
+            migrate_unpartitioned_messages(cur)
+        
+        # Engagement snapshots, appended only when a message's values change
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS raw.telegram_engagement_history (
+                message_id INTEGER,
+                channel_name VARCHAR(255),
+                scraped_at TIMESTAMP,
+                views INTEGER,
+                forwards INTEGER,
+                PRIMARY KEY (message_id, channel_name, scraped_at)
+            );
+        """)
+        
+        # Sequence-backed integer keys for channels, used by dbt for channel_key
+        # and message_key. Seeded once from already loaded messages.
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS raw.channel_registry (
+                channel_key BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                channel_name VARCHAR(255) NOT NULL UNIQUE,
+                registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        cur.execute("""
+            INSERT INTO raw.channel_registry (channel_name)
+            SELECT DISTINCT channel_name FROM raw.telegram_messages
+            WHERE NOT EXISTS (SELECT 1 FROM raw.channel_registry)
+            ORDER BY channel_name
+            ON CONFLICT (channel_name) DO NOTHING;
+        """)
+        
+        # Which partition files (and which version of them) are loaded
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS raw._load_ledger (
+                file_path TEXT PRIMARY KEY,
+                checksum TEXT NOT NULL,
+                file_size BIGINT,
+                file_mtime DOUBLE PRECISION,
+                row_count INTEGER,
+                loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
         """)
         
@@ -62,62 +152,533 @@ def create_schema_and_table(conn):
         print("Schema and table created successfully")
 
 
-def load_json_files(conn):
-    """Load all JSON files from the data lake into PostgreSQL."""
-    # Find all JSON files (excluding manifest files)
-    pattern = os.path.join(DATA_PATH, "**", "*.json")
-    json_files = [f for f in glob.glob(pattern, recursive=True) 
-                  if not os.path.basename(f).startswith("_")]
+def month_partition_name(month):
+    return f"telegram_messages_{month:%Y_%m}"
+
+
+def ensure_month_partition(cur, month):
+    """
+    Create the raw.telegram_messages partition for the month starting at
+    `month`, moving any of its rows out of the default partition first.
+    """
+    name = month_partition_name(month)
+    cur.execute("SELECT to_regclass(%s)", (f"raw.{name}",))
+    if cur.fetchone()[0] is not None:
+        return False
+    next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    cur.execute(f"CREATE TABLE raw.{name} (LIKE raw.telegram_messages INCLUDING DEFAULTS);")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM raw.telegram_messages_default
+            WHERE message_date >= %s AND message_date < %s
+            RETURNING *
+        )
+        INSERT INTO raw.{name} SELECT * FROM moved;
+    """, (month, next_month))
+    cur.execute(
+        f"ALTER TABLE raw.telegram_messages ATTACH PARTITION raw.{name} FOR VALUES FROM (%s) TO (%s);",
+        (month, next_month),
+    )
+    return True
+
+
+def iter_months(start_date, end_date):
+    month = start_date.replace(day=1)
+    while month <= end_date:
+        yield month
+        month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def ensure_partitions(conn, json_files):
+    """Create the monthly partitions the batch's messages fall into, from the lake index date ranges."""
+    index = datalake.read_lake_index(BASE_PATH)
+    months = set()
+    for json_file in json_files:
+        stats = index[_ledger_key(json_file)]
+        if stats["min_message_date"] and stats["max_message_date"]:
+            months.update(iter_months(
+                date.fromisoformat(stats["min_message_date"][:10]),
+                date.fromisoformat(stats["max_message_date"][:10]),
+            ))
+    created = 0
+    with conn.cursor() as cur:
+        for month in sorted(months):
+            created += ensure_month_partition(cur, month)
+    conn.commit()
+    if created:
+        print(f"Created {created} monthly partition(s)")
+    return created
+
+
+def migrate_unpartitioned_messages(cur):
+    """Copy raw.telegram_messages_unpartitioned into the partitioned table and drop it."""
+    cur.execute("""
+        SELECT DISTINCT DATE_TRUNC('month', message_date)::date
+        FROM raw.telegram_messages_unpartitioned
+        WHERE message_date IS NOT NULL
+    """)
+    for (month,) in cur.fetchall():
+        ensure_month_partition(cur, month)
+    columns = ", ".join(MESSAGE_COLUMNS + ("loaded_at", "row_hash"))
+    # Messages without a date can't be partitioned; merge_stage skips them too
+    cur.execute(f"""
+        INSERT INTO raw.telegram_messages ({columns})
+        SELECT {columns} FROM raw.telegram_messages_unpartitioned
+        WHERE message_date IS NOT NULL;
+    """)
+    print(f"Moved {cur.rowcount} messages into the partitioned raw.telegram_messages")
+    # CASCADE drops the dbt staging views on the old table; the next dbt run recreates them
+    cur.execute("DROP TABLE raw.telegram_messages_unpartitioned CASCADE;")
+
+
+def register_channels(conn, json_files):
+    """Give every channel in the batch a channel_key before its messages are loaded."""
+    # json_files come from the lake index, which records each file's channel
+    index = datalake.read_lake_index(BASE_PATH)
+    channels = sorted({index[_ledger_key(f)]["channel"] for f in json_files})
+    if not channels:
+        return 0
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            "INSERT INTO raw.channel_registry (channel_name) VALUES %s ON CONFLICT (channel_name) DO NOTHING",
+            [(channel,) for channel in channels],
+        )
+        registered = cur.rowcount
+    conn.commit()
+    if registered:
+        print(f"Registered {registered} new channel(s)")
+    return registered
+
+
+def find_partition_files(channel_name=None, start_date=None, end_date=None):
+    """
+    Refresh the lake index and return only the partition files whose
+    statistics overlap the requested channel/date range.
+    """
+    datalake.refresh_lake_index(BASE_PATH)
+    return datalake.query_lake_index(
+        BASE_PATH, channel_name=channel_name, start_date=start_date, end_date=end_date
+    )
+
+
+def _ledger_key(json_file):
+    # Same relative path the lake index is keyed on
+    return os.path.relpath(json_file, DATA_PATH)
+
+
+def filter_unloaded_files(conn, json_files, full_refresh=False):
+    """
+    Drop files the ledger already holds with the same checksum, so a rerun
+    only touches new or rewritten partitions. `full_refresh` keeps them all.
+    """
+    if full_refresh:
+        return json_files
+
+    index = datalake.read_lake_index(BASE_PATH)
+    with conn.cursor() as cur:
+        cur.execute("SELECT file_path, checksum FROM raw._load_ledger;")
+        ledger = dict(cur.fetchall())
+
+    pending = []
+    for json_file in json_files:
+        key = _ledger_key(json_file)
+        checksum = index[key]["sha256"] if key in index else datalake.file_checksum(json_file)
+        if ledger.get(key) != checksum:
+            pending.append(json_file)
+
+    print(f"{len(json_files) - len(pending)} file(s) already loaded, {len(pending)} new or changed")
+    return pending
+
+
+def record_loaded_file(cur, json_file, row_count, index):
+    """Upsert the ledger row; runs in the same transaction as the file's rows."""
+    key = _ledger_key(json_file)
+    stats = index.get(key)
+    if stats is None:
+        stats = datalake.describe_partition_file(json_file)
+    cur.execute("""
+        INSERT INTO raw._load_ledger (file_path, checksum, file_size, file_mtime, row_count)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (file_path) DO UPDATE SET
+            checksum = EXCLUDED.checksum,
+            file_size = EXCLUDED.file_size,
+            file_mtime = EXCLUDED.file_mtime,
+            row_count = EXCLUDED.row_count,
+            loaded_at = CURRENT_TIMESTAMP;
+    """, (key, stats["sha256"], stats["bytes"], stats["mtime"], row_count))
+
+
+def load_json_files(conn, json_files, upsert=False, history=False):
+    """Load the given data lake partition files into PostgreSQL, one file per transaction."""
     
     if not json_files:
-        print(f"No JSON files found in {DATA_PATH}")
+        print(f"No new partition files to load from {DATA_PATH}")
         return
     
     print(f"Found {len(json_files)} JSON file(s) to load")
     
     total_records = 0
+    total_written = 0
+    create_staging_table(conn)
+    index = datalake.read_lake_index(BASE_PATH)
     
     with conn.cursor() as cur:
         for json_file in json_files:
             print(f"Loading: {os.path.basename(json_file)}")
             
-            with open(json_file, 'r', encoding='utf-8') as f:
-                messages = json.load(f)
+            # Prepare data for insertion
+            scraped_at = file_scraped_at(json_file)
+            records = [stage_record(msg, scraped_at) for msg in datalake.iter_channel_messages(json_file)]
             
-            if not messages:
+            if not records:
                 print(f"No messages in {os.path.basename(json_file)}")
+                record_loaded_file(cur, json_file, 0, index)
+                conn.commit()
                 continue
             
-            # Prepare data for insertion
-            records = []
-            for msg in messages:
-                records.append((
-                    msg.get('message_id'),
-                    msg.get('channel_name'),
-                    msg.get('message_date'),
-                    msg.get('message_text'),
-                    msg.get('has_media'),
-                    msg.get('image_path'),
-                    msg.get('views'),
-                    msg.get('forwards')
-                ))
-            
             # Insert data using execute_values for better performance
-            insert_query = """
-                INSERT INTO raw.telegram_messages 
-                (message_id, channel_name, message_date, message_text, 
-                 has_media, image_path, views, forwards)
-                VALUES %s
-                ON CONFLICT (message_id, channel_name) DO NOTHING;
+            insert_query = f"""
+                INSERT INTO telegram_messages_stage ({', '.join(STAGE_COLUMNS)})
+                VALUES %s;
             """
             
             execute_values(cur, insert_query, records)
+            total_written += merge_stage(cur, upsert=upsert, history=history)
+            record_loaded_file(cur, json_file, len(records), index)
             conn.commit()
             
             print(f"Loaded {len(records)} records")
             total_records += len(records)
     
-    print(f"\nTotal records loaded: {total_records}")
+    print(f"\nTotal records loaded: {total_records}, rows inserted/changed: {total_written}")
+
+
+def message_record(msg):
+    """Tuple of raw.telegram_messages column values for one lake message."""
+    return tuple(msg.get(column) for column in MESSAGE_COLUMNS)
+
+
+def row_hash(record):
+    """Stable hash of a message's column values, used to detect changed rows."""
+    payload = json.dumps(record, ensure_ascii=False, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+def stage_record(msg, scraped_at):
+    """Staging tuple: the message's columns, its scrape time and its row hash."""
+    record = message_record(msg)
+    return record + (msg.get("scraped_at") or scraped_at, row_hash(record))
+
+
+def file_scraped_at(json_file):
+    # Partitions written before messages carried scraped_at fall back to the file's mtime
+    return datetime.fromtimestamp(os.path.getmtime(json_file), tz=timezone.utc).isoformat()
+
+
+def _copy_value(value):
+    # CSV for COPY: unquoted empty is NULL, so every string is quoted
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_line(record):
+    return ",".join(_copy_value(v) for v in record) + "\n"
+
+
+class CopyStream:
+    """
+    Read-only file object that renders records as COPY CSV lazily, so a
+    partition is streamed to the server without materializing it.
+    """
+
+    def __init__(self, records):
+        self._records = iter(records)
+        self._buffer = ""
+        self.count = 0
+
+    def read(self, size=-1):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            try:
+                record = next(self._records)
+            except StopIteration:
+                break
+            line = _copy_line(record)
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+        data = "".join(parts)
+        if size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def create_staging_table(conn):
+    """
+    Session-private staging table for COPY. Temp tables skip WAL like
+    UNLOGGED ones and cannot collide between concurrent loader sessions.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS telegram_messages_stage (
+                stage_seq BIGSERIAL,
+                message_id INTEGER,
+                channel_name VARCHAR(255),
+                message_date TIMESTAMP,
+                message_text TEXT,
+                has_media BOOLEAN,
+                image_path TEXT,
+                views INTEGER,
+                forwards INTEGER,
+                scraped_at TIMESTAMP,
+                row_hash TEXT
+            );
+        """)
+
+
+def copy_payload_to_stage(cur, payload):
+    """COPY an already rendered CSV payload into the staging table."""
+    cur.copy_expert(
+        f"COPY telegram_messages_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        io.StringIO(payload),
+    )
+
+
+def copy_to_stage(cur, records):
+    """Stream records into the staging table with COPY; returns the row count."""
+    stream = CopyStream(records)
+    cur.copy_expert(
+        f"COPY telegram_messages_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        stream,
+    )
+    return stream.count
+
+
+def merge_stage(cur, upsert=False, history=False):
+    """
+    Set-based merge of the staged rows into raw.telegram_messages.
+
+    By default existing messages are left alone. With `upsert`, a message is
+    rewritten only when its row hash differs from the stored one, and with
+    `history` every inserted or changed row also appends a
+    (message_id, channel_name, scraped_at, views, forwards) snapshot.
+    Returns the number of rows inserted or changed.
+    """
+    columns = ", ".join(MESSAGE_COLUMNS)
+    if upsert:
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in MESSAGE_COLUMNS[2:])
+        on_conflict = f"""
+            DO UPDATE SET {updates},
+                row_hash = EXCLUDED.row_hash,
+                loaded_at = CURRENT_TIMESTAMP
+            WHERE raw.telegram_messages.row_hash IS DISTINCT FROM EXCLUDED.row_hash"""
+    else:
+        on_conflict = "DO NOTHING"
+
+    # message_date is part of the primary key, so a dateless message would
+    # abort the whole batch; skip it (as the partition migration does)
+    cur.execute("SELECT COUNT(*) FROM telegram_messages_stage WHERE message_date IS NULL;")
+    undated = cur.fetchone()[0]
+    if undated:
+        print(f"Skipping {undated} staged message(s) without a message_date")
+
+    # A batch can hold the same message twice (e.g. daily file + compacted
+    # month); keep the most recently staged copy
+    merge_query = f"""
+        INSERT INTO raw.telegram_messages ({columns}, row_hash)
+        SELECT DISTINCT ON (message_id, channel_name) {columns}, row_hash
+        FROM telegram_messages_stage
+        WHERE message_date IS NOT NULL
+        ORDER BY message_id, channel_name, stage_seq DESC
+        ON CONFLICT (message_id, channel_name, message_date) {on_conflict}
+    """
+    if history:
+        cur.execute(f"""
+            WITH changed AS (
+                {merge_query}
+                RETURNING message_id, channel_name
+            ),
+            snapshots AS (
+                INSERT INTO raw.telegram_engagement_history
+                    (message_id, channel_name, scraped_at, views, forwards)
+                SELECT DISTINCT ON (s.message_id, s.channel_name)
+                    s.message_id, s.channel_name,
+                    COALESCE(s.scraped_at, CURRENT_TIMESTAMP), s.views, s.forwards
+                FROM telegram_messages_stage s
+                JOIN changed c USING (message_id, channel_name)
+                ORDER BY s.message_id, s.channel_name, s.stage_seq DESC
+                ON CONFLICT DO NOTHING
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM changed), (SELECT COUNT(*) FROM snapshots);
+        """)
+        written = cur.fetchone()[0]
+    else:
+        cur.execute(merge_query)
+        written = cur.rowcount
+    cur.execute("TRUNCATE telegram_messages_stage;")
+    return written
+
+
+def bulk_load_files(conn, json_files, commit_every=50, upsert=False, history=False):
+    """
+    Load partition files via COPY into the staging table, merging and
+    committing once per `commit_every` files (0 = a single transaction).
+    """
+
+    if not json_files:
+        print(f"No new partition files to load from {DATA_PATH}")
+        return
+
+    print(f"Found {len(json_files)} JSON file(s) to bulk load")
+    create_staging_table(conn)
+    index = datalake.read_lake_index(BASE_PATH)
+
+    total_staged = 0
+    total_inserted = 0
+    pending = 0
+
+    with conn.cursor() as cur:
+        for json_file in json_files:
+            scraped_at = file_scraped_at(json_file)
+            staged = copy_to_stage(
+                cur,
+                (stage_record(msg, scraped_at) for msg in datalake.iter_channel_messages(json_file)),
+            )
+            print(f"Staged {staged} records from {os.path.basename(json_file)}")
+            record_loaded_file(cur, json_file, staged, index)
+            total_staged += staged
+            pending += 1
+
+            if commit_every and pending >= commit_every:
+                total_inserted += merge_stage(cur, upsert=upsert, history=history)
+                conn.commit()
+                pending = 0
+
+        if pending:
+            total_inserted += merge_stage(cur, upsert=upsert, history=history)
+            conn.commit()
+
+    print(f"\nTotal records staged: {total_staged}, rows inserted/changed: {total_inserted}")
+
+
+def parse_partition_file(json_file):
+    """
+    Process-pool task: decode a partition and render it as COPY CSV, which
+    is the CPU-bound part of a load. Returns (json_file, payload, row_count).
+    """
+    scraped_at = file_scraped_at(json_file)
+    lines = [
+        _copy_line(stage_record(msg, scraped_at))
+        for msg in datalake.iter_channel_messages(json_file)
+    ]
+    return json_file, "".join(lines), len(lines)
+
+
+def _loader_thread(batches, index, upsert, history, totals, errors, lock):
+    """Loader-pool thread: one connection, one transaction per parsed file."""
+    conn = None
+    try:
+        conn = get_connection()
+        create_staging_table(conn)
+        with conn.cursor() as cur:
+            while True:
+                batch = batches.get()
+                try:
+                    if batch is None:
+                        return
+                    if errors:
+                        continue
+                    json_file, payload, count = batch
+                    copy_payload_to_stage(cur, payload)
+                    written = merge_stage(cur, upsert=upsert, history=history)
+                    record_loaded_file(cur, json_file, count, index)
+                    conn.commit()
+                    with lock:
+                        totals["records"] += count
+                        totals["written"] += written
+                    print(f"Loaded {count} records from {os.path.basename(json_file)}")
+                finally:
+                    batches.task_done()
+    except Exception as e:
+        errors.append(e)
+        # Keep draining so the producer never blocks on a dead consumer
+        while True:
+            batch = batches.get()
+            batches.task_done()
+            if batch is None:
+                return
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def parallel_load_files(json_files, workers, loaders=None, upsert=False, history=False):
+    """
+    Parse partitions in a pool of `workers` processes and load the results
+    through `loaders` database connections. At most 2 * workers files are
+    being parsed and 2 * loaders parsed files wait for a connection, so
+    memory stays bounded however large the lake is.
+    """
+
+    if not json_files:
+        print(f"No new partition files to load from {DATA_PATH}")
+        return
+
+    loaders = loaders or min(4, workers)
+    print(f"Found {len(json_files)} JSON file(s); parsing with {workers} worker(s), loading with {loaders} connection(s)")
+    index = datalake.read_lake_index(BASE_PATH)
+
+    batches = queue.Queue(maxsize=2 * loaders)
+    totals = {"records": 0, "written": 0}
+    errors = []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(
+            target=_loader_thread,
+            args=(batches, index, upsert, history, totals, errors, lock),
+            daemon=True,
+        )
+        for _ in range(loaders)
+    ]
+    for thread in threads:
+        thread.start()
+
+    pending_files = iter(json_files)
+    in_flight = set()
+    # spawn, not fork: the loader threads already hold libpq connections
+    # that a forked child would inherit mid-use
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for json_file in pending_files:
+                in_flight.add(pool.submit(parse_partition_file, json_file))
+                if len(in_flight) >= 2 * workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batches.put(future.result())
+                if errors:
+                    break
+            for future in in_flight:
+                batches.put(future.result())
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    print(f"\nTotal records loaded: {totals['records']}, rows inserted/changed: {totals['written']}")
 
 
 def verify_load(conn):
@@ -139,8 +700,24 @@ def verify_load(conn):
             print(f"  {row[0]}: {row[1]} messages")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load raw Telegram messages into PostgreSQL.")
+    parser.add_argument("--channel", help="Only load partitions for this channel")
+    parser.add_argument("--start-date", help="Only load partitions with messages on/after YYYY-MM-DD")
+    parser.add_argument("--end-date", help="Only load partitions with messages on/before YYYY-MM-DD")
+    parser.add_argument("--full-refresh", action="store_true", help="Reload every partition, ignoring the load ledger")
+    parser.add_argument("--upsert", action="store_true", help="Update messages whose values changed (e.g. views/forwards)")
+    parser.add_argument("--history", action="store_true", help="Append engagement snapshots for inserted/changed messages")
+    parser.add_argument("--bulk", action="store_true", help="Load via COPY into a staging table and merge set-based")
+    parser.add_argument("--workers", type=int, default=0, help="Parse files in N processes and load them over a small connection pool")
+    parser.add_argument("--loaders", type=int, help="With --workers: number of loader connections (default min(4, workers))")
+    parser.add_argument("--commit-every", type=int, default=50, help="Bulk mode: files per merge/commit (0 = one transaction)")
+    return parser.parse_args()
+
+
 def main():
     """Main execution function."""
+    args = parse_args()
     print("=" * 60)
     print("Loading Raw Telegram Data to PostgreSQL")
     print("=" * 60)
@@ -157,7 +734,20 @@ def main():
         
         # Load JSON files
         print("\nLoading JSON files...")
-        load_json_files(conn)
+        json_files = find_partition_files(args.channel, args.start_date, args.end_date)
+        json_files = filter_unloaded_files(conn, json_files, full_refresh=args.full_refresh)
+        register_channels(conn, json_files)
+        ensure_partitions(conn, json_files)
+        if args.workers:
+            parallel_load_files(
+                json_files, args.workers, loaders=args.loaders, upsert=args.upsert, history=args.history
+            )
+        elif args.bulk:
+            bulk_load_files(
+                conn, json_files, commit_every=args.commit_every, upsert=args.upsert, history=args.history
+            )
+        else:
+            load_json_files(conn, json_files, upsert=args.upsert, history=args.history)
         
         # Verify
         print("\nVerifying data...")
@@ -1,12 +1,14 @@
 """
-Script to load YOLO detection results from CSV into PostgreSQL.
+Script to load YOLO detection results (per-image summaries and per-box
+detections) from CSV into PostgreSQL.
 """
 
+import io
 import os
+import argparse
 import pandas as pd
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import execute_values
 
 load_dotenv()
 
@@ -20,6 +22,12 @@ DB_NAME = os.getenv("DB_NAME", "medical_warehouse")
 # Paths
 BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CSV_PATH = os.path.join(BASE_PATH, "data", "yolo_results.csv")
+BOXES_CSV_PATH = os.path.join(BASE_PATH, "data", "yolo_boxes.csv")
+CSV_COLUMNS = ['message_id', 'channel_name', 'detected_class', 'confidence_score', 'image_category']
+BOX_COLUMNS = ['message_id', 'channel_name', 'box_index', 'detected_class', 'confidence_score', 'x1', 'y1', 'x2', 'y2']
+
+# Rows read, copied and upserted per transaction
+CHUNK_ROWS = int(os.getenv("YOLO_LOAD_CHUNK_ROWS", "50000"))
 
 def get_connection():
     return psycopg2.connect(
@@ -44,40 +52,190 @@ def create_table(conn):
                 PRIMARY KEY (message_id, channel_name)
             );
         """)
+        # One row per detected object (xyxy pixel coordinates)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS raw.yolo_detection_boxes (
+                message_id INTEGER,
+                channel_name VARCHAR(255),
+                box_index INTEGER,
+                detected_class VARCHAR(255),
+                confidence_score FLOAT,
+                x1 FLOAT,
+                y1 FLOAT,
+                x2 FLOAT,
+                y2 FLOAT,
+                loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (message_id, channel_name, box_index)
+            );
+        """)
+        # Incremental dbt models select new rows by loaded_at
+        cur.execute("CREATE INDEX IF NOT EXISTS yolo_detections_loaded_at ON raw.yolo_detections (loaded_at);")
         conn.commit()
 
-def load_csv(conn):
+def create_staging_table(cur):
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS yolo_detections_stage (
+            stage_seq BIGSERIAL,
+            message_id INTEGER,
+            channel_name VARCHAR(255),
+            detected_class VARCHAR(255),
+            confidence_score FLOAT,
+            image_category VARCHAR(255)
+        ) ON COMMIT DELETE ROWS;
+    """)
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS yolo_boxes_stage (
+            stage_seq BIGSERIAL,
+            message_id INTEGER,
+            channel_name VARCHAR(255),
+            box_index INTEGER,
+            detected_class VARCHAR(255),
+            confidence_score FLOAT,
+            x1 FLOAT,
+            y1 FLOAT,
+            x2 FLOAT,
+            y2 FLOAT
+        ) ON COMMIT DELETE ROWS;
+    """)
+
+
+def copy_chunk(cur, table, columns, chunk):
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def upsert_chunk(cur, chunk):
+    """COPY one chunk into staging and upsert it; returns the rows merged."""
+    copy_chunk(cur, "yolo_detections_stage", CSV_COLUMNS, chunk)
+    # A resumed detection run can repeat an image; the last row wins
+    cur.execute("""
+        INSERT INTO raw.yolo_detections
+        (message_id, channel_name, detected_class, confidence_score, image_category)
+        SELECT DISTINCT ON (message_id, channel_name)
+            message_id, channel_name, detected_class, confidence_score, image_category
+        FROM yolo_detections_stage
+        ORDER BY message_id, channel_name, stage_seq DESC
+        ON CONFLICT (message_id, channel_name) DO UPDATE SET
+            detected_class = EXCLUDED.detected_class,
+            confidence_score = EXCLUDED.confidence_score,
+            image_category = EXCLUDED.image_category,
+            loaded_at = CURRENT_TIMESTAMP;
+    """)
+    return cur.rowcount
+
+
+def upsert_boxes_chunk(cur, chunk, run_started):
+    """
+    COPY one chunk of boxes into staging and replace the boxes of the images
+    it covers. Only boxes loaded before this run are deleted, so an image
+    whose boxes straddle two chunks keeps both halves.
+    """
+    copy_chunk(cur, "yolo_boxes_stage", BOX_COLUMNS, chunk)
+    cur.execute("""
+        DELETE FROM raw.yolo_detection_boxes b
+        USING (SELECT DISTINCT message_id, channel_name FROM yolo_boxes_stage) s
+        WHERE b.message_id = s.message_id
+          AND b.channel_name = s.channel_name
+          AND b.loaded_at < %s;
+    """, (run_started,))
+    cur.execute("""
+        INSERT INTO raw.yolo_detection_boxes
+        (message_id, channel_name, box_index, detected_class, confidence_score, x1, y1, x2, y2)
+        SELECT DISTINCT ON (message_id, channel_name, box_index)
+            message_id, channel_name, box_index, detected_class, confidence_score, x1, y1, x2, y2
+        FROM yolo_boxes_stage
+        ORDER BY message_id, channel_name, box_index, stage_seq DESC
+        ON CONFLICT (message_id, channel_name, box_index) DO UPDATE SET
+            detected_class = EXCLUDED.detected_class,
+            confidence_score = EXCLUDED.confidence_score,
+            x1 = EXCLUDED.x1,
+            y1 = EXCLUDED.y1,
+            x2 = EXCLUDED.x2,
+            y2 = EXCLUDED.y2,
+            loaded_at = CURRENT_TIMESTAMP;
+    """)
+    return cur.rowcount
+
+
+def file_identity(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def remove_loaded_csvs(identities):
+    """
+    Delete the CSVs once every chunk is committed, so yolo_detect.py starts
+    a fresh delta. A file replaced by a detection run since the load began
+    is kept for the next load.
+    """
+    for path, identity in identities.items():
+        if identity is not None and file_identity(path) == identity:
+            os.remove(path)
+        elif identity is not None:
+            print(f"{path} changed during the load; keeping it for the next run")
+
+
+def load_csv(conn, chunk_rows=CHUNK_ROWS):
+    """
+    Stream the summary and box CSVs in `chunk_rows` chunks, committing after
+    each, so memory stays flat and an interrupted load can simply be rerun.
+    The CSVs are removed only after the whole load succeeded.
+    """
     if not os.path.exists(CSV_PATH):
         print(f"CSV file not found: {CSV_PATH}")
         return
+    identities = {CSV_PATH: file_identity(CSV_PATH), BOXES_CSV_PATH: file_identity(BOXES_CSV_PATH)}
 
-    df = pd.read_csv(CSV_PATH)
-    
-    # Ensure message_id is integer
-    df['message_id'] = df['message_id'].astype(int)
-    
-    records = df.values.tolist()
-    
     with conn.cursor() as cur:
-        insert_query = """
-            INSERT INTO raw.yolo_detections 
-            (message_id, channel_name, detected_class, confidence_score, image_category)
-            VALUES %s
-            ON CONFLICT (message_id, channel_name) DO UPDATE SET
-                detected_class = EXCLUDED.detected_class,
-                confidence_score = EXCLUDED.confidence_score,
-                image_category = EXCLUDED.image_category,
-                loaded_at = CURRENT_TIMESTAMP;
-        """
-        execute_values(cur, insert_query, records)
+        create_staging_table(cur)
+        cur.execute("SELECT CURRENT_TIMESTAMP")
+        run_started = cur.fetchone()[0]
         conn.commit()
-        print(f"Loaded {len(records)} records into raw.yolo_detections")
+
+        total = 0
+        for chunk in pd.read_csv(CSV_PATH, usecols=CSV_COLUMNS, dtype={'message_id': int}, chunksize=chunk_rows):
+            total += upsert_chunk(cur, chunk[CSV_COLUMNS])
+            conn.commit()
+        print(f"Loaded {total} records into raw.yolo_detections")
+
+        # Images without detections have no box rows; their old boxes are cleared
+        cur.execute("""
+            DELETE FROM raw.yolo_detection_boxes b
+            USING raw.yolo_detections d
+            WHERE b.message_id = d.message_id
+              AND b.channel_name = d.channel_name
+              AND d.loaded_at >= %s
+              AND d.detected_class = 'none'
+              AND b.loaded_at < %s;
+        """, (run_started, run_started))
+        conn.commit()
+
+        if not os.path.exists(BOXES_CSV_PATH):
+            print(f"Boxes file not found: {BOXES_CSV_PATH}")
+        else:
+            total = 0
+            for chunk in pd.read_csv(BOXES_CSV_PATH, usecols=BOX_COLUMNS, dtype={'message_id': int}, chunksize=chunk_rows):
+                total += upsert_boxes_chunk(cur, chunk[BOX_COLUMNS], run_started)
+                conn.commit()
+            print(f"Loaded {total} boxes into raw.yolo_detection_boxes")
+
+    remove_loaded_csvs(identities)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load YOLO detection results into PostgreSQL.")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="CSV rows per COPY/upsert transaction")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     try:
         conn = get_connection()
         create_table(conn)
-        load_csv(conn)
+        load_csv(conn, chunk_rows=args.chunk_rows)
         conn.close()
     except Exception as e:
         print(f"Error: {e}")
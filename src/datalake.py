@@ -1,21 +1,67 @@
+import glob
+import gzip
+import hashlib
 import json
 import os
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+# Partition file suffixes, newest format first. Legacy `.json` files hold a
+# single JSON array; the `.jsonl*` files hold one message per line.
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+MESSAGE_FILE_SUFFIXES = (".parquet", ".jsonl", ".jsonl.gz", ".jsonl.zst", ".json")
+FILE_FORMATS = ("jsonl", "parquet")
+
+# Parquet columns mirror raw.telegram_messages (see scripts/load_to_postgres.py),
+# plus the time the message's engagement numbers were scraped
+MESSAGE_COLUMNS = (
+    "message_id",
+    "channel_name",
+    "message_date",
+    "message_text",
+    "has_media",
+    "image_path",
+    "views",
+    "forwards",
+    "scraped_at",
+)
 
 
 def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
+def telegram_messages_dir(base_path: str) -> str:
+    return os.path.join(base_path, "data", "raw", "telegram_messages")
+
+
 def telegram_messages_partition_dir(base_path: str, date_str: str) -> str:
-    return os.path.join(base_path, "data", "raw", "telegram_messages", date_str)
+    return os.path.join(telegram_messages_dir(base_path), date_str)
+
+
+def telegram_messages_monthly_dir(base_path: str, month_str: str) -> str:
+    """Compacted partitions live at telegram_messages/monthly/<YYYY-MM>/<channel>.parquet."""
+    return os.path.join(telegram_messages_dir(base_path), "monthly", month_str)
 
 
 def telegram_images_dir(base_path: str) -> str:
     return os.path.join(base_path, "data", "raw", "images")
 
 
+def telegram_image_cache_dir(base_path: str) -> str:
+    """Preprocessed image variants (see src/image_cache.py), parallel to the originals."""
+    return os.path.join(base_path, "data", "raw", "image_cache")
+
+
+def telegram_image_blobs_dir(base_path: str) -> str:
+    """Content-addressed image blobs that duplicate images are hardlinked to (see src/image_fingerprint.py)."""
+    return os.path.join(base_path, "data", "raw", "image_blobs")
+
+
+def image_fingerprints_path(base_path: str) -> str:
+    return os.path.join(base_path, "data", "raw", "image_fingerprints.sqlite")
+
+
 def channel_images_dir(base_path: str, channel_name: str) -> str:
     img_dir = os.path.join(telegram_images_dir(base_path), channel_name)
     ensure_dir(img_dir)
@@ -28,6 +74,20 @@ def channel_messages_json_path(base_path: str, date_str: str, channel_name: str)
     return os.path.join(partition_dir, f"{channel_name}.json")
 
 
+def _write_json_atomic(path: str, payload: Any) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_channel_messages_json(path: str) -> List[Dict[str, Any]]:
+    """Read a (date, channel) partition written by `write_channel_messages_json`."""
+
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
 def write_channel_messages_json(
     *,
     base_path: str,
@@ -43,12 +103,407 @@ def write_channel_messages_json(
     return out_path
 
 
+def channel_messages_jsonl_path(
+    base_path: str, date_str: str, channel_name: str, compression: Optional[str] = None
+) -> str:
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unsupported compression: {compression!r}")
+    partition_dir = telegram_messages_partition_dir(base_path, date_str)
+    ensure_dir(partition_dir)
+    return os.path.join(
+        partition_dir, f"{channel_name}.jsonl{COMPRESSION_SUFFIXES[compression]}"
+    )
+
+
+def channel_messages_parquet_path(base_path: str, date_str: str, channel_name: str) -> str:
+    partition_dir = telegram_messages_partition_dir(base_path, date_str)
+    ensure_dir(partition_dir)
+    return os.path.join(partition_dir, f"{channel_name}.parquet")
+
+
+def is_messages_file(path: str) -> bool:
+    name = os.path.basename(path)
+    return not name.startswith("_") and name.endswith(MESSAGE_FILE_SUFFIXES)
+
+
+def find_channel_messages_paths(base_path: str, date_str: str, channel_name: str) -> List[str]:
+    """Return every partition file (any format) for a (date, channel)."""
+
+    partition_dir = telegram_messages_partition_dir(base_path, date_str)
+    return [
+        os.path.join(partition_dir, f"{channel_name}{suffix}")
+        for suffix in MESSAGE_FILE_SUFFIXES
+        if os.path.exists(os.path.join(partition_dir, f"{channel_name}{suffix}"))
+    ]
+
+
+def list_messages_files(base_path: str) -> List[str]:
+    """Return all message partition files in the raw data lake."""
+
+    pattern = os.path.join(telegram_messages_dir(base_path), "**", "*")
+    return sorted(f for f in glob.glob(pattern, recursive=True) if is_messages_file(f))
+
+
+def _compression_for_path(path: str) -> Optional[str]:
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return compression
+    return None
+
+
+def _open_text(path: str, mode: str, compression: Optional[str]) -> IO[str]:
+    if compression == "gzip":
+        return gzip.open(path, f"{mode}t", encoding="utf-8")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd compression requires the 'zstandard' package") from e
+        return zstandard.open(path, f"{mode}t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+_TIMESTAMP_COLUMNS = ("message_date", "scraped_at")
+
+
+def _messages_arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("message_id", pa.int32()),
+            ("channel_name", pa.string()),
+            ("message_date", pa.timestamp("us", tz="UTC")),
+            ("message_text", pa.string()),
+            ("has_media", pa.bool_()),
+            ("image_path", pa.string()),
+            ("views", pa.int32()),
+            ("forwards", pa.int32()),
+            ("scraped_at", pa.timestamp("us", tz="UTC")),
+        ]
+    )
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Parquet partitions require the 'pyarrow' package") from e
+
+
+def _to_arrow_row(msg: Dict[str, Any]) -> Dict[str, Any]:
+    row = {column: msg.get(column) for column in MESSAGE_COLUMNS}
+    for column in _TIMESTAMP_COLUMNS:
+        if isinstance(row[column], str):
+            row[column] = datetime.fromisoformat(row[column])
+    return row
+
+
+def _from_arrow_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    # Hand back the same shape the JSON partitions have
+    for column in _TIMESTAMP_COLUMNS:
+        if isinstance(row.get(column), datetime):
+            row[column] = row[column].isoformat()
+    return row
+
+
+def iter_channel_messages(path: str, columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield messages from a partition file of any supported format.
+    `columns` limits the fields returned; Parquet files only read those columns.
+    """
+
+    if path.endswith(".parquet"):
+        _import_pyarrow()
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(columns=columns):
+            for row in batch.to_pylist():
+                yield _from_arrow_row(row)
+        return
+
+    if path.endswith(".json"):
+        # Legacy partitions are a single JSON array
+        messages: Iterator[Dict[str, Any]] = iter(read_channel_messages_json(path))
+    else:
+        messages = _iter_jsonl(path)
+    for msg in messages:
+        yield msg if columns is None else {column: msg.get(column) for column in columns}
+
+
+def _iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with _open_text(path, "r", _compression_for_path(path)) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_messages_table(paths: List[str], columns: Optional[List[str]] = None, filters=None):
+    """
+    Read Parquet partitions as one pyarrow Table, pushing the column
+    projection and `filters` (pyarrow expression or DNF list) down to the files.
+    """
+
+    _import_pyarrow()
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    dataset = ds.dataset(paths, format="parquet")
+    if filters is not None and not isinstance(filters, ds.Expression):
+        filters = pq.filters_to_expression(filters)
+    return dataset.to_table(columns=columns, filter=filters)
+
+
+class ChannelMessagesWriter:
+    """
+    Stream messages for one (date, channel) partition as JSON lines.
+
+    Records go to a temp file that is atomically renamed into place by
+    `close()`, so readers never see a half-written partition. When
+    `merge_paths` is given, their records are copied in first and the old
+    files are removed once the new one is in place.
+    """
+
+    def __init__(
+        self, path: str, compression: Optional[str] = None, merge_paths: Optional[List[str]] = None
+    ) -> None:
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.compression = compression
+        self.count = 0
+        self.merged_count = 0
+        self._merge_paths = merge_paths or []
+        self._closed = False
+        self._open()
+        for merge_path in self._merge_paths:
+            for msg in iter_channel_messages(merge_path):
+                self.append(msg)
+        self.merged_count = self.count
+
+    def _open(self) -> None:
+        self._file = _open_text(self.tmp_path, "w", self.compression)
+
+    def _write(self, msg: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(msg, ensure_ascii=False))
+        self._file.write("\n")
+
+    def _close_file(self) -> None:
+        self._file.close()
+
+    def append(self, msg: Dict[str, Any]) -> None:
+        self._write(msg)
+        self.count += 1
+
+    def close(self) -> str:
+        if not self._closed:
+            self._closed = True
+            self._close_file()
+            os.replace(self.tmp_path, self.path)
+            for merge_path in self._merge_paths:
+                if merge_path != self.path and os.path.exists(merge_path):
+                    os.remove(merge_path)
+        return self.path
+
+    def abort(self) -> None:
+        """Discard everything written so far, leaving existing files untouched."""
+        if not self._closed:
+            self._closed = True
+            self._close_file()
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+    def __enter__(self) -> "ChannelMessagesWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ParquetMessagesWriter(ChannelMessagesWriter):
+    """
+    Same streaming/atomic contract as ChannelMessagesWriter, but writes a
+    typed Parquet file, flushing a row group every `row_group_size` messages.
+    `compression` is the Parquet codec (snappy by default).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compression: Optional[str] = None,
+        merge_paths: Optional[List[str]] = None,
+        row_group_size: int = 50_000,
+    ) -> None:
+        _import_pyarrow()
+        self.row_group_size = row_group_size
+        super().__init__(path, compression=compression or "snappy", merge_paths=merge_paths)
+
+    def _open(self) -> None:
+        import pyarrow.parquet as pq
+
+        self._schema = _messages_arrow_schema()
+        self._buffer: List[Dict[str, Any]] = []
+        self._writer = pq.ParquetWriter(self.tmp_path, self._schema, compression=self.compression)
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+
+        if self._buffer:
+            self._writer.write_table(pa.Table.from_pylist(self._buffer, schema=self._schema))
+            self._buffer = []
+
+    def _write(self, msg: Dict[str, Any]) -> None:
+        self._buffer.append(_to_arrow_row(msg))
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _close_file(self) -> None:
+        self._flush()
+        self._writer.close()
+
+    def abort(self) -> None:
+        # Unflushed rows are discarded rather than written on the way out
+        self._buffer = []
+        super().abort()
+
+
+def open_channel_messages_writer(
+    *,
+    base_path: str,
+    date_str: str,
+    channel_name: str,
+    compression: Optional[str] = None,
+    merge_existing: bool = False,
+    file_format: str = "jsonl",
+) -> ChannelMessagesWriter:
+    """
+    Open a streaming writer for a (date, channel) partition.
+    `file_format` is "jsonl" (gzip/zstd `compression`) or "parquet"
+    (`compression` is the Parquet codec).
+    """
+
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Unsupported file format: {file_format!r}")
+    merge_paths = (
+        find_channel_messages_paths(base_path, date_str, channel_name) if merge_existing else None
+    )
+    if file_format == "parquet":
+        out_path = channel_messages_parquet_path(base_path, date_str, channel_name)
+        return ParquetMessagesWriter(out_path, compression=compression, merge_paths=merge_paths)
+    out_path = channel_messages_jsonl_path(base_path, date_str, channel_name, compression)
+    return ChannelMessagesWriter(out_path, compression=compression, merge_paths=merge_paths)
+
+
+def compact_month(
+    *,
+    base_path: str,
+    month_str: str,
+    channel_name: Optional[str] = None,
+    delete_source: bool = True,
+    compression: str = "zstd",
+) -> List[str]:
+    """
+    Merge a month of daily (date, channel) partitions into one Parquet file
+    per channel under `telegram_messages_monthly_dir`. Messages seen on
+    several days keep their latest scrape, and rows are sorted by message_id
+    so row-group statistics prune id ranges well. Returns the written paths.
+    """
+
+    _import_pyarrow()
+    daily_files: Dict[str, List[str]] = {}
+    for partition_dir in sorted(glob.glob(os.path.join(telegram_messages_dir(base_path), f"{month_str}-*"))):
+        for path in sorted(os.listdir(partition_dir)):
+            full_path = os.path.join(partition_dir, path)
+            if not is_messages_file(full_path):
+                continue
+            name = _channel_from_path(full_path)
+            if channel_name is None or name == channel_name:
+                daily_files.setdefault(name, []).append(full_path)
+
+    written = []
+    for name, paths in sorted(daily_files.items()):
+        out_dir = telegram_messages_monthly_dir(base_path, month_str)
+        ensure_dir(out_dir)
+        out_path = os.path.join(out_dir, f"{name}.parquet")
+
+        # Re-compaction folds in the existing monthly file first so newer
+        # daily scrapes overwrite it
+        sources = ([out_path] if os.path.exists(out_path) else []) + paths
+        latest: Dict[Any, Dict[str, Any]] = {}
+        for path in sources:
+            for msg in iter_channel_messages(path):
+                latest[msg.get("message_id")] = msg
+
+        with ParquetMessagesWriter(out_path, compression=compression) as writer:
+            for message_id in sorted(latest, key=lambda m: (m is None, m)):
+                writer.append(latest[message_id])
+        written.append(out_path)
+
+        if delete_source:
+            for path in paths:
+                os.remove(path)
+
+    if written:
+        refresh_lake_index(base_path)
+    return written
+
+
+def _channel_from_path(path: str) -> str:
+    name = os.path.basename(path)
+    for suffix in MESSAGE_FILE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
 def manifest_path(base_path: str, date_str: str) -> str:
     partition_dir = telegram_messages_partition_dir(base_path, date_str)
     ensure_dir(partition_dir)
     return os.path.join(partition_dir, "_manifest.json")
 
 
+def file_checksum(path: str) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def describe_partition_file(path: str) -> Dict[str, Any]:
+    """Row count, id/date ranges, size and checksum of one partition file."""
+
+    stat = os.stat(path)
+    rows = 0
+    message_ids: List[int] = []
+    message_dates: List[str] = []
+    for msg in iter_channel_messages(path, columns=["message_id", "message_date"]):
+        rows += 1
+        if msg.get("message_id") is not None:
+            message_ids.append(int(msg["message_id"]))
+        if msg.get("message_date"):
+            message_dates.append(
+                datetime.fromisoformat(msg["message_date"]).astimezone(timezone.utc).isoformat()
+            )
+    return {
+        "channel": _channel_from_path(path),
+        "rows": rows,
+        "min_message_id": min(message_ids) if message_ids else None,
+        "max_message_id": max(message_ids) if message_ids else None,
+        "min_message_date": min(message_dates) if message_dates else None,
+        "max_message_date": max(message_dates) if message_dates else None,
+        "bytes": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": file_checksum(path),
+    }
+
+
 def write_manifest(
     *,
     base_path: str,
@@ -56,13 +511,25 @@ def write_manifest(
     channel_message_counts: Dict[str, int],
     extra: Optional[Dict[str, Any]] = None,
 ) -> str:
-    """Write a simple audit/metadata file for the day's scrape."""
+    """
+    Write the audit/metadata file for the day's scrape, with per-file
+    statistics for every partition file of that day, and refresh the lake index.
+    """
+
+    partition_dir = telegram_messages_partition_dir(base_path, date_str)
+    files: Dict[str, Dict[str, Any]] = {}
+    if os.path.isdir(partition_dir):
+        for name in sorted(os.listdir(partition_dir)):
+            path = os.path.join(partition_dir, name)
+            if is_messages_file(path):
+                files[name] = describe_partition_file(path)
 
     payload: Dict[str, Any] = {
         "date": date_str,
         "run_utc": datetime.now(timezone.utc).isoformat(),
         "channels": channel_message_counts,
         "total_messages": sum(channel_message_counts.values()),
+        "files": files,
     }
     if extra:
         payload.update(extra)
@@ -70,4 +537,116 @@ def write_manifest(
     out_path = manifest_path(base_path, date_str)
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(payload, f, ensure_ascii=False, indent=2)
+
+    # The day's stats are already computed, so seed the index with them
+    refresh_lake_index(
+        base_path, known={os.path.join(date_str, name): stats for name, stats in files.items()}
+    )
     return out_path
+
+
+def lake_index_path(base_path: str) -> str:
+    messages_dir = telegram_messages_dir(base_path)
+    ensure_dir(messages_dir)
+    return os.path.join(messages_dir, "_lake_index.json")
+
+
+def read_lake_index(base_path: str) -> Dict[str, Dict[str, Any]]:
+    """Return {path relative to the messages dir: file stats}."""
+
+    path = lake_index_path(base_path)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def refresh_lake_index(
+    base_path: str, known: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Bring the lake index up to date with the files on disk. Files whose
+    size and mtime are unchanged keep their stats; new or modified files are
+    described, and vanished files are dropped. `known` supplies stats that
+    were just computed for some files.
+    """
+
+    messages_dir = telegram_messages_dir(base_path)
+    index = read_lake_index(base_path)
+    index.update(known or {})
+    refreshed: Dict[str, Dict[str, Any]] = {}
+    for path in list_messages_files(base_path):
+        rel_path = os.path.relpath(path, messages_dir)
+        stats = index.get(rel_path)
+        stat = os.stat(path)
+        if stats is None or stats["bytes"] != stat.st_size or stats["mtime"] != stat.st_mtime:
+            stats = describe_partition_file(path)
+        refreshed[rel_path] = stats
+
+    _write_json_atomic(
+        lake_index_path(base_path),
+        {"updated_utc": datetime.now(timezone.utc).isoformat(), "files": refreshed},
+    )
+    return refreshed
+
+
+def query_lake_index(
+    base_path: str,
+    *,
+    channel_name: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    min_message_id: Optional[int] = None,
+    max_message_id: Optional[int] = None,
+) -> List[str]:
+    """
+    Return the partition files that can hold messages for the channel,
+    inclusive YYYY-MM-DD date range and message_id range, using only the
+    index statistics. Empty files never match.
+    """
+
+    messages_dir = telegram_messages_dir(base_path)
+    matches = []
+    for rel_path, stats in sorted(read_lake_index(base_path).items()):
+        if not stats["rows"]:
+            continue
+        if channel_name is not None and stats["channel"] != channel_name:
+            continue
+        if start_date and (stats["max_message_date"] or "")[:10] < start_date:
+            continue
+        if end_date and stats["min_message_date"] and stats["min_message_date"][:10] > end_date:
+            continue
+        if min_message_id is not None and stats["max_message_id"] is not None \
+                and stats["max_message_id"] < min_message_id:
+            continue
+        if max_message_id is not None and stats["min_message_id"] is not None \
+                and stats["min_message_id"] > max_message_id:
+            continue
+        matches.append(os.path.join(messages_dir, rel_path))
+    return matches
+
+
+def checkpoints_path(base_path: str) -> str:
+    messages_dir = telegram_messages_dir(base_path)
+    ensure_dir(messages_dir)
+    return os.path.join(messages_dir, "_checkpoints.json")
+
+
+def read_checkpoints(base_path: str) -> Dict[str, int]:
+    """Return the last scraped message_id per channel (empty before the first run)."""
+
+    path = checkpoints_path(base_path)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {channel: int(message_id) for channel, message_id in json.load(f).items()}
+
+
+def update_checkpoint(*, base_path: str, channel_name: str, message_id: int) -> Dict[str, int]:
+    """Advance a channel's high-water mark; never moves it backwards."""
+
+    checkpoints = read_checkpoints(base_path)
+    if message_id > checkpoints.get(channel_name, 0):
+        checkpoints[channel_name] = message_id
+        _write_json_atomic(checkpoints_path(base_path), checkpoints)
+    return checkpoints
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_version(weights_path: str, backend: str = "torch") -> str:
+    """Identify a detector by its weights' content, so retrained weights never reuse old results."""
+
+    return f"{os.path.basename(weights_path)}:{file_sha256(weights_path)[:16]}:{backend}"
+
+
+class DetectionCache:
+    """
+    SQLite cache of per-image detection results keyed on
+    (image content hash, model version).
+
+    Image hashes are remembered per path together with size and mtime, so
+    unchanged files are not re-read on every run. Every detected box is kept
+    alongside the summary as a JSON list of [class, confidence, x1, y1, x2, y2].
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                image_path TEXT PRIMARY KEY,
+                file_size INTEGER NOT NULL,
+                file_mtime REAL NOT NULL,
+                content_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS detections (
+                content_hash TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                detected_class TEXT,
+                confidence_score REAL,
+                image_category TEXT,
+                boxes TEXT,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (content_hash, model_version)
+            );
+            """
+        )
+        # Caches created before per-box export lack the boxes column
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(detections)")]
+        if "boxes" not in columns:
+            self.conn.execute("ALTER TABLE detections ADD COLUMN boxes TEXT")
+
+    def content_hash(self, image_path: str) -> Tuple[str, bool]:
+        """Return (content_hash, changed); `changed` is True for new or modified files."""
+
+        stat = os.stat(image_path)
+        row = self.conn.execute(
+            "SELECT file_size, file_mtime, content_hash FROM image_hashes WHERE image_path = ?",
+            (image_path,),
+        ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2], False
+
+        content_hash = file_sha256(image_path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO image_hashes (image_path, file_size, file_mtime, content_hash) "
+            "VALUES (?, ?, ?, ?)",
+            (image_path, stat.st_size, stat.st_mtime, content_hash),
+        )
+        return content_hash, row is None or row[2] != content_hash
+
+    def get(self, content_hash: str, version: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT detected_class, confidence_score, image_category, boxes FROM detections "
+            "WHERE content_hash = ? AND model_version = ?",
+            (content_hash, version),
+        ).fetchone()
+        # Entries without boxes predate per-box export and are re-detected
+        if row is None or row[3] is None:
+            return None
+        return {
+            "detected_class": row[0],
+            "confidence_score": row[1],
+            "image_category": row[2],
+            "boxes": json.loads(row[3]),
+        }
+
+    def put(self, content_hash: str, version: str, result: Dict[str, Any]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO detections "
+            "(content_hash, model_version, detected_class, confidence_score, image_category, boxes, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                content_hash,
+                version,
+                result["detected_class"],
+                result["confidence_score"],
+                result["image_category"],
+                json.dumps(result["boxes"]),
+                datetime.now(timezone.utc).isoformat(),
+            ),
+        )
+
+    def put_many(self, items: Iterable[Tuple[str, str, Dict[str, Any]]]) -> None:
+        for content_hash, version, result in items:
+            self.put(content_hash, version, result)
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self) -> "DetectionCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,43 @@
+"""
+Stdlib client for the detection service (src/detection_service.py), so
+callers do not need torch/ultralytics installed or imported.
+"""
+import os
+import json
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+DETECTION_SERVICE_URL = os.getenv("DETECTION_SERVICE_URL", "")
+
+
+def _request(url: str, path: str, payload: Optional[Dict[str, Any]] = None, timeout: float = 600) -> Dict[str, Any]:
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(
+        url.rstrip("/") + path,
+        data=data,
+        headers={"Content-Type": "application/json"},
+        method="GET" if data is None else "POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def service_health(url: str = DETECTION_SERVICE_URL, timeout: float = 2) -> Optional[Dict[str, Any]]:
+    """The service's /health payload, or None if no service answers at `url`."""
+    if not url:
+        return None
+    try:
+        return _request(url, "/health", timeout=timeout)
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def detect_images(image_paths: List[str], url: str = DETECTION_SERVICE_URL, timeout: float = 600) -> Dict[str, Any]:
+    """Submit a batch of image paths; returns {"model_version", "results", "failed"}."""
+    return _request(url, "/detect", {"image_paths": list(image_paths)}, timeout=timeout)
+
+
+def run_detection(full_export: bool = False, url: str = DETECTION_SERVICE_URL, timeout: float = 3600) -> Dict[str, Any]:
+    """Have the service scan the image directory and write the results CSV."""
+    return _request(url, "/run", {"full_export": full_export}, timeout=timeout)
@@ -0,0 +1,135 @@
+"""
+Long-lived local detection service.
+
+Keeps the YOLO model loaded between requests so callers (the Dagster
+pipeline, the scraper, ad-hoc tools) skip interpreter startup, the
+torch/ultralytics import and model load on every run.
+
+Run with:
+    python src/detection_service.py [--host 127.0.0.1] [--port 8765]
+
+Endpoints:
+    GET  /health  model version and request counters
+    POST /detect  {"image_paths": [...]} -> per-image detections and boxes
+    POST /run     {"full_export": false} -> same as `python src/yolo_detect.py`
+"""
+import os
+import time
+import argparse
+import threading
+from contextlib import asynccontextmanager
+from typing import List
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+import yolo_detect
+import detection_cache
+import detector_backends
+import image_fingerprint
+
+SERVICE_HOST = os.getenv("DETECTION_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("DETECTION_SERVICE_PORT", "8765"))
+
+# One model, one inference at a time; requests queue on the lock
+_inference_lock = threading.Lock()
+# Shared across requests; the store serializes its own SQLite access
+_fingerprints = None
+_stats = {"model_version": None, "started_at": None, "requests": 0, "images": 0, "failed": 0}
+
+
+class DetectRequest(BaseModel):
+    image_paths: List[str]
+    batch_size: int = yolo_detect.BATCH_SIZE
+
+
+class RunRequest(BaseModel):
+    full_export: bool = False
+    batch_size: int = yolo_detect.BATCH_SIZE
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _fingerprints
+    # Load (and for non-torch backends export) the model before serving
+    start = time.perf_counter()
+    model_version = yolo_detect.get_model_version()
+    _stats["model_version"] = model_version
+    _stats["started_at"] = time.time()
+    print(f"Detection model {model_version} loaded in {time.perf_counter() - start:.1f}s")
+    if yolo_detect.USE_NEAR_DUPLICATES:
+        _fingerprints = image_fingerprint.FingerprintStore(yolo_detect.FINGERPRINTS_PATH, yolo_detect.BLOB_DIR)
+    yield
+    if _fingerprints is not None:
+        _fingerprints.close()
+
+
+app = FastAPI(title="Detection Service", lifespan=lifespan)
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "uptime_seconds": time.time() - _stats["started_at"], **_stats}
+
+
+@app.post("/detect")
+def detect(request: DetectRequest):
+    """Detections for the given image paths, served from the cache where possible."""
+    missing = [p for p in request.image_paths if not os.path.isfile(p)]
+    image_paths = [p for p in request.image_paths if os.path.isfile(p)]
+
+    model_version = _stats["model_version"]
+    results = []
+    with _inference_lock:
+        # Fresh results go to the pending .part CSVs as well, or the next
+        # run_detection would see them as cache hits and never export them.
+        # SQLite connections are per thread; requests run in a thread pool
+        with yolo_detect.partial_csv_writers() as (write_rows, checkpoint), \
+                detection_cache.DetectionCache(yolo_detect.CACHE_PATH) as cache:
+            for img_path, summary, fresh in yolo_detect.iter_cached_detections(
+                image_paths, cache, model_version, batch_size=request.batch_size,
+                before_commit=checkpoint, fingerprints=_fingerprints,
+            ):
+                if fresh:
+                    write_rows(img_path, summary)
+                results.append({
+                    "image_path": img_path,
+                    **yolo_detect.build_result_row(img_path, summary),
+                    "boxes": summary["boxes"],
+                })
+        detected = {r["image_path"] for r in results}
+        # Missing files, or files that could not be decoded
+        failed = missing + [p for p in image_paths if p not in detected]
+        _stats["requests"] += 1
+        _stats["images"] += len(request.image_paths)
+        _stats["failed"] += len(failed)
+
+    return {"model_version": model_version, "results": results, "failed": failed}
+
+
+@app.post("/run")
+def run(request: RunRequest):
+    """Scan the image directory and write OUTPUT_CSV, like the yolo_detect.py CLI."""
+    with _inference_lock:
+        try:
+            rows = yolo_detect.run_detection(batch_size=request.batch_size, full_export=request.full_export)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Detection failed: {e}")
+        _stats["requests"] += 1
+    return {"rows": rows, "output_csv": yolo_detect.OUTPUT_CSV, "model_version": _stats["model_version"]}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve YOLO detection with the model kept in memory.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--backend", choices=detector_backends.BACKENDS, default=yolo_detect.DETECT_BACKEND, help="Inference runtime")
+    parser.add_argument("--int8", action="store_true", default=yolo_detect.DETECT_INT8, help="INT8-quantize (openvino)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    yolo_detect.configure_backend(args.backend, args.int8)
+    uvicorn.run(app, host=args.host, port=args.port)
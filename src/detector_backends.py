@@ -0,0 +1,141 @@
+import glob
+import json
+import os
+import random
+import shutil
+from datetime import datetime, timezone
+from typing import Optional
+
+from ultralytics import YOLO
+
+import detection_cache
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+
+def backend_label(backend: str, int8: bool = False) -> str:
+    return f"{backend}-int8" if int8 else backend
+
+
+def parse_backend_label(label: str):
+    """'openvino-int8' -> ('openvino', True)"""
+    backend, _, precision = label.partition("-")
+    if backend not in BACKENDS or precision not in ("", "int8"):
+        raise ValueError(f"Unknown detector backend: {label!r}")
+    return backend, precision == "int8"
+
+
+def resolve_weights(weights: str) -> str:
+    """Path of the PyTorch checkpoint, letting ultralytics download it if needed."""
+    if os.path.exists(weights):
+        return weights
+    return YOLO(weights).ckpt_path
+
+
+def build_calibration_dataset(image_dir: str, out_dir: str, names, sample_size: int = 300, seed: int = 0) -> str:
+    """
+    Copy a seeded sample of our own scraped images into a label-free YOLO
+    dataset for INT8 post-training calibration. Returns its data.yaml path.
+    """
+    images = sorted(glob.glob(os.path.join(image_dir, "**", "*.jpg"), recursive=True))
+    if not images:
+        raise ValueError(f"No images under {image_dir} to calibrate INT8 quantization with")
+    sample = random.Random(seed).sample(images, min(sample_size, len(images)))
+
+    val_dir = os.path.join(out_dir, "images", "val")
+    os.makedirs(val_dir, exist_ok=True)
+    for img_path in sample:
+        channel_name = os.path.basename(os.path.dirname(img_path))
+        shutil.copy2(img_path, os.path.join(val_dir, f"{channel_name}_{os.path.basename(img_path)}"))
+
+    # JSON is valid YAML, so no YAML writer is needed
+    yaml_path = os.path.join(out_dir, "data.yaml")
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"path": os.path.abspath(out_dir), "train": "images/val", "val": "images/val", "names": dict(names)},
+            f,
+            indent=2,
+        )
+    return yaml_path
+
+
+def export_detector(
+    weights: str,
+    backend: str,
+    int8: bool = False,
+    export_dir: str = "models",
+    image_dir: Optional[str] = None,
+    imgsz: int = 640,
+) -> str:
+    """
+    Export the checkpoint to `backend` once and return the artifact path.
+    Exports are cached under `export_dir` and redone only when the
+    checkpoint's content changes.
+    """
+    weights = resolve_weights(weights)
+    if backend == "torch":
+        if int8:
+            raise ValueError("INT8 is only supported for the openvino backend")
+        return weights
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend!r}")
+    if int8 and backend != "openvino":
+        raise ValueError("INT8 is only supported for the openvino backend")
+
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    out_dir = os.path.join(export_dir, f"{stem}-{backend_label(backend, int8)}")
+    manifest_path = os.path.join(out_dir, "export.json")
+    weights_sha256 = detection_cache.file_sha256(weights)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        artifact = os.path.join(out_dir, manifest["artifact"])
+        if manifest["weights_sha256"] == weights_sha256 and os.path.exists(artifact):
+            return artifact
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    # Export from a private copy so the artifact lands inside out_dir
+    local_weights = shutil.copy2(weights, os.path.join(out_dir, os.path.basename(weights)))
+    model = YOLO(local_weights)
+
+    # Dynamic shapes let batches through and keep the minimal-padding
+    # letterbox, matching the PyTorch path
+    export_args = {"format": backend, "imgsz": imgsz, "dynamic": True}
+    if int8:
+        if image_dir is None:
+            raise ValueError("INT8 export needs image_dir for calibration images")
+        export_args["int8"] = True
+        export_args["data"] = build_calibration_dataset(
+            image_dir, os.path.join(out_dir, "calibration"), model.names
+        )
+    artifact = model.export(**export_args)
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "weights": os.path.basename(weights),
+                "weights_sha256": weights_sha256,
+                "backend": backend,
+                "int8": int8,
+                "artifact": os.path.relpath(artifact, out_dir),
+                "exported_utc": datetime.now(timezone.utc).isoformat(),
+            },
+            f,
+            indent=2,
+        )
+    return artifact
+
+
+def load_detector(weights: str, backend: str = "torch", int8: bool = False, **export_kwargs) -> YOLO:
+    """YOLO model running on `backend`; the result API is the same for every backend."""
+    if backend == "torch" and not int8:
+        return YOLO(weights)
+    return YOLO(export_detector(weights, backend, int8, **export_kwargs), task="detect")
+
+
+def detector_version(weights: str, backend: str = "torch", int8: bool = False) -> str:
+    """Cache key for detections: source checkpoint content plus runtime/precision."""
+    return detection_cache.model_version(resolve_weights(weights), backend=backend_label(backend, int8))
+
@@ -0,0 +1,137 @@
+"""
+Preprocessed copies of scraped images, kept in a tree parallel to the
+originals:
+
+    data/raw/image_cache/detect/<channel>/<message_id>.jpg  640x640 letterboxed, for the detector
+    data/raw/image_cache/thumbs/<channel>/<message_id>.jpg  small thumbnail, for serving
+
+Built at scrape time (or backfilled with `python src/image_cache.py`) so
+detection decodes a small fixed-size JPEG instead of the full original.
+"""
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_DIR = os.path.join(BASE_PATH, "data", "raw", "images")
+CACHE_DIR = os.path.join(BASE_PATH, "data", "raw", "image_cache")
+
+DETECT_SIZE = 640
+THUMB_SIZE = 256
+# Same gray ultralytics pads letterboxed images with
+PAD_COLOR = (114, 114, 114)
+VARIANTS = ("detect", "thumbs")
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def letterbox_geometry(width: int, height: int, size: int = DETECT_SIZE) -> Tuple[float, int, int, int, int]:
+    """(scale, resized_width, resized_height, pad_x, pad_y) for fitting an image into size x size."""
+    scale = min(size / width, size / height)
+    new_w, new_h = max(1, round(width * scale)), max(1, round(height * scale))
+    return scale, new_w, new_h, (size - new_w) // 2, (size - new_h) // 2
+
+
+def original_size(img_path: str) -> Tuple[int, int]:
+    """Upright (width, height) read from the header only, honouring EXIF orientation."""
+    with Image.open(img_path) as img:
+        width, height = img.size
+        if img.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+            return height, width
+        return width, height
+
+
+def variant_path(img_path: str, variant: str, images_dir: str = IMAGE_DIR, cache_dir: str = CACHE_DIR) -> Optional[str]:
+    """Cache path mirroring `img_path` under `cache_dir/variant`, or None outside `images_dir`."""
+    rel_path = os.path.relpath(os.path.abspath(img_path), os.path.abspath(images_dir))
+    if rel_path.startswith(os.pardir):
+        return None
+    return os.path.join(cache_dir, variant, rel_path)
+
+
+def is_fresh(cached_path: str, img_path: str) -> bool:
+    return os.path.exists(cached_path) and os.path.getmtime(cached_path) >= os.path.getmtime(img_path)
+
+
+def _save_jpeg(img: Image.Image, path: str, quality: int) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temp name so concurrent readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.part"
+    img.save(tmp_path, format="JPEG", quality=quality)
+    os.replace(tmp_path, path)
+
+
+def letterbox(img: Image.Image, size: int = DETECT_SIZE) -> Image.Image:
+    _, new_w, new_h, pad_x, pad_y = letterbox_geometry(img.width, img.height, size)
+    canvas = Image.new("RGB", (size, size), PAD_COLOR)
+    canvas.paste(img.resize((new_w, new_h), Image.BILINEAR), (pad_x, pad_y))
+    return canvas
+
+
+def build_variants(img_path: str, images_dir: str = IMAGE_DIR, cache_dir: str = CACHE_DIR,
+                   size: int = DETECT_SIZE, thumb_size: int = THUMB_SIZE, force: bool = False) -> Dict[str, str]:
+    """
+    Write the missing or stale cached variants of one image, decoding the
+    original at most once. Returns {variant: path} for every variant.
+    """
+    paths = {variant: variant_path(img_path, variant, images_dir, cache_dir) for variant in VARIANTS}
+    if any(path is None for path in paths.values()):
+        raise ValueError(f"{img_path} is not under {images_dir}")
+    stale = [variant for variant, path in paths.items() if force or not is_fresh(path, img_path)]
+    if not stale:
+        return paths
+
+    with Image.open(img_path) as original:
+        img = ImageOps.exif_transpose(original).convert("RGB")
+    if "detect" in stale:
+        _save_jpeg(letterbox(img, size), paths["detect"], quality=90)
+    if "thumbs" in stale:
+        img.thumbnail((thumb_size, thumb_size))
+        _save_jpeg(img, paths["thumbs"], quality=80)
+    return paths
+
+
+def ensure_detect_copy(img_path: str, images_dir: str = IMAGE_DIR, cache_dir: str = CACHE_DIR,
+                       size: int = DETECT_SIZE) -> Optional[str]:
+    """Path of the fresh detector-sized copy, building it if needed; None outside `images_dir`."""
+    path = variant_path(img_path, "detect", images_dir, cache_dir)
+    if path is None:
+        return None
+    if not is_fresh(path, img_path):
+        build_variants(img_path, images_dir, cache_dir, size=size)
+    return path
+
+
+def backfill(images_dir: str = IMAGE_DIR, cache_dir: str = CACHE_DIR, workers: int = 4, force: bool = False) -> int:
+    """Build variants for every image under `images_dir`; returns the number processed."""
+    image_paths = [
+        os.path.join(root, name)
+        for root, _, files in os.walk(images_dir)
+        for name in files
+        if name.lower().endswith(".jpg")
+    ]
+
+    def build(img_path):
+        try:
+            build_variants(img_path, images_dir, cache_dir, force=force)
+            return True
+        except Exception as e:
+            print(f"Skipping {img_path}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        built = sum(pool.map(build, image_paths))
+    print(f"Image cache up to date for {built} of {len(image_paths)} images in {cache_dir}")
+    return built
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build detector-sized copies and thumbnails of scraped images.")
+    parser.add_argument("--workers", type=int, default=4, help="Images processed in parallel")
+    parser.add_argument("--force", action="store_true", help="Rebuild even fresh variants")
+    args = parser.parse_args()
+    backfill(workers=args.workers, force=args.force)
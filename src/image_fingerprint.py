@@ -0,0 +1,357 @@
+"""
+Exact and near-duplicate fingerprints of scraped images.
+
+Every image gets a sha256 content hash (exact duplicates) and a 64-bit
+dHash (near duplicates: recompressed or lightly edited reposts). Exact
+duplicates share one content-addressed blob under data/raw/image_blobs/,
+with every data/raw/images/<channel>/<message_id>.jpg hardlinked to it.
+Near duplicates of the same size share a canonical content hash, which
+detection uses as its cache key.
+
+Backfill existing images with:
+    python src/image_fingerprint.py [--link]
+"""
+import os
+import hashlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_DIR = os.path.join(BASE_PATH, "data", "raw", "images")
+BLOB_DIR = os.path.join(BASE_PATH, "data", "raw", "image_blobs")
+FINGERPRINTS_PATH = os.path.join(BASE_PATH, "data", "raw", "image_fingerprints.sqlite")
+
+DHASH_SIZE = 8
+# dHash bits that may differ for two images to count as near duplicates
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", "4"))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dhash(img_path: str, size: int = DHASH_SIZE) -> int:
+    """64-bit difference hash: one bit per horizontally adjacent pixel pair of a 9x8 grayscale thumbnail."""
+    with Image.open(img_path) as img:
+        # JPEG draft mode decodes at a reduced scale, far cheaper than a full decode
+        img.draft("L", (size * 8, size * 8))
+        pixels = img.convert("L").resize((size + 1, size), Image.BILINEAR).tobytes()
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_signed64(value: int) -> int:
+    """Unsigned 64-bit hash to the signed range SQLite/Postgres integers hold."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def from_signed64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over hashes under Hamming distance. Lookups within
+    a small radius only visit children whose edge distance is within that
+    radius of the query's distance to the node (triangle inequality).
+    """
+
+    def __init__(self, distance: Callable[[int, int], int] = hamming) -> None:
+        self.distance = distance
+        # Node: [key, values, {edge_distance: child}]
+        self.root: Optional[list] = None
+        self.size = 0
+
+    def add(self, key: int, value: Any) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = [key, [value], {}]
+            return
+        node = self.root
+        while True:
+            d = self.distance(key, node[0])
+            if d == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [key, [value], {}]
+                return
+            node = child
+
+    def search(self, key: int, max_distance: int) -> List[Tuple[int, int, Any]]:
+        """(distance, key, value) for every entry within `max_distance`, nearest first."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = self.distance(key, node[0])
+            if d <= max_distance:
+                found.extend((d, node[0], value) for value in node[1])
+            for edge, child in node[2].items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def blob_path_for(content_hash: str, blob_dir: str = BLOB_DIR) -> str:
+    return os.path.join(blob_dir, content_hash[:2], f"{content_hash}.jpg")
+
+
+def _replace_with_link(src: str, dst: str) -> bool:
+    """Atomically make `dst` a hardlink to `src`; False where hardlinks are unsupported."""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return True
+    tmp_path = f"{dst}.{os.getpid()}.link"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        return False
+    os.replace(tmp_path, dst)
+    return True
+
+
+class FingerprintStore:
+    """
+    SQLite map of image content hashes to fingerprints and blobs, and of
+    (channel_name, message_id) to content hash. Safe to share across threads.
+
+    Canonical hashes group near duplicates: an image whose dHash is within
+    NEAR_DUPLICATE_DISTANCE of an earlier canonical image of the same size
+    takes that image's hash as its canonical hash.
+    """
+
+    def __init__(self, path: str = FINGERPRINTS_PATH, blob_dir: str = BLOB_DIR,
+                 max_distance: int = NEAR_DUPLICATE_DISTANCE) -> None:
+        self.path = path
+        self.blob_dir = blob_dir
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                content_hash TEXT PRIMARY KEY,
+                dhash INTEGER NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                canonical_hash TEXT NOT NULL,
+                blob_path TEXT,
+                created_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS image_messages (
+                channel_name TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                image_path TEXT NOT NULL,
+                telegram_photo_id INTEGER,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (channel_name, message_id)
+            );
+            CREATE INDEX IF NOT EXISTS image_messages_content_hash ON image_messages (content_hash);
+            CREATE INDEX IF NOT EXISTS image_messages_photo_id ON image_messages (telegram_photo_id);
+            """
+        )
+        # Canonical images only; near duplicates are found through their canonical
+        self._canonical_tree = BKTree()
+        for content_hash, value, width, height in self.conn.execute(
+            "SELECT content_hash, dhash, width, height FROM fingerprints WHERE canonical_hash = content_hash"
+        ):
+            self._canonical_tree.add(from_signed64(value), (content_hash, width, height))
+
+    def _get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT content_hash, dhash, width, height, canonical_hash, blob_path FROM fingerprints "
+            "WHERE content_hash = ?",
+            (content_hash,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "content_hash": row[0],
+            "dhash": from_signed64(row[1]),
+            "width": row[2],
+            "height": row[3],
+            "canonical_hash": row[4],
+            "blob_path": row[5],
+        }
+
+    def fingerprint(self, img_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """The stored fingerprint of an image's content, computing and storing it if new."""
+        content_hash = content_hash or file_sha256(img_path)
+        with self._lock:
+            record = self._get(content_hash)
+        if record is not None:
+            return record
+
+        # Decode outside the lock; only the bookkeeping is serialized
+        value = dhash(img_path)
+        with Image.open(img_path) as img:
+            width, height = img.size
+
+        with self._lock:
+            record = self._get(content_hash)
+            if record is not None:
+                return record
+            canonical_hash = content_hash
+            for _, _, (candidate, c_width, c_height) in self._canonical_tree.search(value, self.max_distance):
+                if (c_width, c_height) == (width, height):
+                    canonical_hash = candidate
+                    break
+            self.conn.execute(
+                "INSERT INTO fingerprints (content_hash, dhash, width, height, canonical_hash, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, to_signed64(value), width, height, canonical_hash,
+                 datetime.now(timezone.utc).isoformat()),
+            )
+            if canonical_hash == content_hash:
+                self._canonical_tree.add(value, (content_hash, width, height))
+            self.conn.commit()
+            return self._get(content_hash)
+
+    def canonical_hash(self, img_path: str, content_hash: Optional[str] = None) -> str:
+        return self.fingerprint(img_path, content_hash)["canonical_hash"]
+
+    def store_blob(self, img_path: str, content_hash: str) -> Optional[str]:
+        """
+        Make `img_path` share the content-addressed blob of its content: the
+        first copy becomes the blob, later copies are replaced by hardlinks.
+        Returns the blob path, or None if hardlinks are unavailable.
+        """
+        blob_path = blob_path_for(content_hash, self.blob_dir)
+        with self._lock:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            if os.path.exists(blob_path):
+                linked = _replace_with_link(blob_path, img_path)
+            else:
+                linked = _replace_with_link(img_path, blob_path)
+            if not linked:
+                return None
+            self.conn.execute(
+                "UPDATE fingerprints SET blob_path = ? WHERE content_hash = ?", (blob_path, content_hash)
+            )
+            self.conn.commit()
+        return blob_path
+
+    def add_image(self, channel_name: str, message_id: int, img_path: str,
+                  telegram_photo_id: Optional[int] = None, link: bool = True) -> Dict[str, Any]:
+        """Fingerprint a message's image, dedup its storage and record the mapping."""
+        record = self.fingerprint(img_path)
+        if link:
+            record["blob_path"] = self.store_blob(img_path, record["content_hash"]) or record["blob_path"]
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO image_messages "
+                "(channel_name, message_id, content_hash, image_path, telegram_photo_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (channel_name, int(message_id), record["content_hash"], img_path, telegram_photo_id,
+                 datetime.now(timezone.utc).isoformat()),
+            )
+            self.conn.commit()
+        return record
+
+    def has_image(self, channel_name: str, message_id: int) -> bool:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM image_messages WHERE channel_name = ? AND message_id = ?",
+                (channel_name, int(message_id)),
+            ).fetchone()
+        return row is not None
+
+    def blob_for_photo(self, telegram_photo_id: int) -> Optional[str]:
+        """Blob of a Telegram photo seen before (forwards keep the photo id), if still on disk."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT f.blob_path FROM image_messages m JOIN fingerprints f USING (content_hash) "
+                "WHERE m.telegram_photo_id = ? AND f.blob_path IS NOT NULL LIMIT 1",
+                (telegram_photo_id,),
+            ).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            return None
+        return row[0]
+
+    def link_blob(self, blob_path: str, img_path: str) -> bool:
+        os.makedirs(os.path.dirname(img_path), exist_ok=True)
+        return _replace_with_link(blob_path, img_path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            images, contents, canonicals = self.conn.execute(
+                "SELECT (SELECT COUNT(*) FROM image_messages), COUNT(*), "
+                "COUNT(DISTINCT canonical_hash) FROM fingerprints"
+            ).fetchone()
+        return {"images": images, "unique_contents": contents, "near_duplicate_groups": canonicals}
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def __enter__(self) -> "FingerprintStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def image_message_key(img_path: str) -> Tuple[str, str]:
+    """(channel_name, message_id) from .../data/raw/images/{channel_name}/{message_id}.jpg"""
+    parts = os.path.normpath(img_path).split(os.sep)
+    return parts[-2], os.path.splitext(parts[-1])[0]
+
+
+def backfill(image_dir: str = IMAGE_DIR, link: bool = False, force: bool = False) -> Dict[str, int]:
+    """
+    Fingerprint the images under `image_dir` that the store does not map yet
+    (every image with `force`), optionally hardlinking duplicates to blobs.
+    """
+    with FingerprintStore() as store:
+        for root, _, files in os.walk(image_dir):
+            for name in sorted(files):
+                if not name.lower().endswith(".jpg"):
+                    continue
+                img_path = os.path.join(root, name)
+                channel_name, message_id = image_message_key(img_path)
+                if not message_id.isdigit() or (not force and store.has_image(channel_name, int(message_id))):
+                    continue
+                try:
+                    store.add_image(channel_name, int(message_id), img_path, link=link)
+                except Exception as e:
+                    print(f"Skipping {img_path}: {e}")
+        stats = store.stats()
+    print(
+        f"{stats['images']} images, {stats['unique_contents']} unique contents, "
+        f"{stats['near_duplicate_groups']} near-duplicate groups"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerprint scraped images and dedup their storage.")
+    parser.add_argument("--link", action="store_true", help="Replace duplicate files with hardlinks to shared blobs")
+    parser.add_argument("--force", action="store_true", help="Re-fingerprint images that are already mapped")
+    args = parser.parse_args()
+    backfill(link=args.link, force=args.force)
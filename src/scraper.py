@@ -3,13 +3,16 @@ import asyncio
 import logging
 import os
 import json
-from datetime import datetime, timezone
+import math
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from telethon import TelegramClient
-from telethon.errors import SessionPasswordNeededError
+from telethon import TelegramClient, utils
+from telethon.errors import FloodWaitError, SessionPasswordNeededError
 from telethon.tl.types import MessageMediaPhoto
 
 import datalake
+import image_cache
+import image_fingerprint
 
 # Load environment variables
 load_dotenv()
@@ -23,6 +26,27 @@ CHANNELS = [
     "https://t.me/lobelia4cosmetics",
     "https://t.me/tikvahpharma"
 ]
+# Concurrency: how many channels are scraped at once and the shared API budget
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+SCRAPE_REQUESTS_PER_SECOND = float(os.getenv("SCRAPE_REQUESTS_PER_SECOND", "2"))
+SCRAPE_BURST = int(os.getenv("SCRAPE_BURST", "5"))
+# Media downloads run in a per-channel worker pool fed by a bounded queue
+MEDIA_DOWNLOAD_WORKERS = int(os.getenv("MEDIA_DOWNLOAD_WORKERS", "4"))
+MEDIA_QUEUE_SIZE = int(os.getenv("MEDIA_QUEUE_SIZE", "100"))
+MEDIA_MAX_RETRIES = int(os.getenv("MEDIA_MAX_RETRIES", "3"))
+# Messages per GetHistory request (Telegram's maximum is 100)
+MESSAGES_PAGE_SIZE = 100
+# Messages posted in the last N days are fetched again below the checkpoint,
+# so the loader's --upsert/--history see their current views and forwards
+ENGAGEMENT_REFRESH_DAYS = float(os.getenv("ENGAGEMENT_REFRESH_DAYS", "3"))
+# Write the detector-sized copy and thumbnail of each photo as it is downloaded
+PREPROCESS_IMAGES = os.getenv("PREPROCESS_IMAGES", "1") == "1"
+# Fingerprint photos; identical ones share one blob and reposts are not re-downloaded
+DEDUP_IMAGES = os.getenv("DEDUP_IMAGES", "1") == "1"
+# Partition format: "jsonl" or "parquet". Compression is gzip/zstd for
+# jsonl (empty for plain .jsonl) or the codec for parquet
+LAKE_FORMAT = os.getenv("LAKE_FORMAT", "jsonl")
+LAKE_COMPRESSION = os.getenv("LAKE_COMPRESSION") or None
 BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LOG_DIR = os.path.join(BASE_PATH, "logs")
 
@@ -40,63 +64,357 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def scrape_channel(client, channel_url, date_str):
+
+class RateLimiter:
+    """
+    Token bucket shared by all channel tasks.
+
+    Every Telegram API request takes one token; tokens refill at `rate` per
+    second up to `burst`. A call that makes several requests (a photo
+    download is one GetFile per chunk) acquires its whole cost at once: it
+    waits for a full bucket at most and leaves the bucket in debt for the
+    rest. A FloodWaitError only puts the task that hit it to sleep, other
+    channels keep spending the remaining budget.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, cost=1):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            needed = min(cost, self.burst)
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    elapsed = now - self._updated
+                    self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= cost
+                    return
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+
+
+def photo_request_count(media):
+    """
+    GetFile requests Telethon makes to download a photo: it fetches the
+    largest size in parts of get_appropriated_part_size() KB.
+    """
+    photo = getattr(media, "photo", None)
+    sizes = list(getattr(photo, "sizes", None) or []) + list(getattr(photo, "video_sizes", None) or [])
+    byte_counts = [max(s.sizes) if hasattr(s, "sizes") else getattr(s, "size", 0) for s in sizes]
+    file_size = max(byte_counts, default=0)
+    if not file_size:
+        return 1
+    return math.ceil(file_size / (utils.get_appropriated_part_size(file_size) * 1024))
+
+
+async def call_with_flood_wait(limiter, func, *args, cost=1, **kwargs):
+    """
+    Await `func(*args, **kwargs)` under the limiter, sleeping out
+    FloodWaitErrors. `cost` is the number of API requests the call makes.
+    """
+    while True:
+        await limiter.acquire(cost)
+        try:
+            return await func(*args, **kwargs)
+        except FloodWaitError as e:
+            logger.warning(f"FloodWait of {e.seconds}s on {func.__name__}, pausing this task")
+            await asyncio.sleep(e.seconds)
+
+
+async def iter_channel_messages(client, entity, limiter, limit=None, offset_id=0, **kwargs):
+    """
+    Iterate a channel's messages newest first, one GetHistory page per
+    limiter token. A FloodWaitError only retries the page that hit it.
+    """
+    fetched = 0
+    while True:
+        page_size = MESSAGES_PAGE_SIZE if limit is None else min(MESSAGES_PAGE_SIZE, limit - fetched)
+        if page_size <= 0:
+            return
+        page = await call_with_flood_wait(
+            limiter, client.get_messages, entity, limit=page_size, offset_id=offset_id, **kwargs
+        )
+        for message in page:
+            offset_id = message.id
+            fetched += 1
+            yield message
+        # A short page means the history (or the min_id range) is exhausted
+        if len(page) < page_size:
+            return
+
+
+async def download_photo(client, limiter, media, file_path, retries=MEDIA_MAX_RETRIES):
+    """
+    Download a photo to a temp file and atomically rename it into place,
+    retrying with exponential backoff. Returns True on success.
+    """
+    tmp_path = f"{file_path}.part"
+    for attempt in range(1, retries + 1):
+        try:
+            await call_with_flood_wait(
+                limiter, client.download_media, media, file=tmp_path, cost=photo_request_count(media)
+            )
+            os.replace(tmp_path, file_path)
+            return True
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if attempt == retries:
+                logger.error(f"Giving up on {file_path} after {attempt} attempts: {e}")
+                return False
+            delay = 2 ** attempt
+            logger.warning(f"Download of {file_path} failed ({e}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+
+
+async def fetch_photo(client, limiter, media, file_path, fingerprints=None):
+    """
+    Hardlink a Telegram photo we already hold (forwards and reposts keep the
+    photo id) to its blob, or download it. Returns True on success.
+    """
+    photo_id = getattr(getattr(media, "photo", None), "id", None)
+    if fingerprints is not None and photo_id is not None:
+        blob_path = await asyncio.to_thread(fingerprints.blob_for_photo, photo_id)
+        if blob_path and await asyncio.to_thread(fingerprints.link_blob, blob_path, file_path):
+            logger.info(f"Linked already stored photo {photo_id} to {file_path}")
+            return True
+    return await download_photo(client, limiter, media, file_path)
+
+
+async def register_image(fingerprints, msg_dict, media, file_path):
+    """Fingerprint a downloaded photo and share storage with identical ones; failures are only logged."""
+    try:
+        await asyncio.to_thread(
+            fingerprints.add_image,
+            msg_dict["channel_name"],
+            msg_dict["message_id"],
+            file_path,
+            getattr(getattr(media, "photo", None), "id", None),
+        )
+    except Exception as e:
+        logger.warning(f"Could not fingerprint {file_path}: {e}")
+
+
+async def preprocess_image(file_path):
+    """Build an image's cached variants off the event loop; failures are only logged."""
+    try:
+        await asyncio.to_thread(
+            image_cache.build_variants,
+            file_path,
+            datalake.telegram_images_dir(BASE_PATH),
+            datalake.telegram_image_cache_dir(BASE_PATH),
+        )
+    except Exception as e:
+        logger.warning(f"Could not preprocess {file_path}: {e}")
+
+
+async def media_download_worker(client, limiter, queue, writer, failed, fingerprints=None):
+    """
+    Drain (msg_dict, media, file_path) jobs, filling in image_path on success,
+    and hand the finished message to the partition writer.
+    """
+    while True:
+        msg_dict, media, file_path = await queue.get()
+        try:
+            try:
+                if await fetch_photo(client, limiter, media, file_path, fingerprints):
+                    msg_dict["image_path"] = str(file_path)
+                    if fingerprints is not None:
+                        await register_image(fingerprints, msg_dict, media, file_path)
+                    if PREPROCESS_IMAGES:
+                        await preprocess_image(file_path)
+                else:
+                    failed.append(msg_dict["message_id"])
+            except Exception as e:
+                # e.g. a fingerprint store error; the message is kept without its photo
+                logger.error(f"Media job for message {msg_dict['message_id']} failed: {e}", exc_info=True)
+                msg_dict["image_path"] = None
+                failed.append(msg_dict["message_id"])
+            # A writer error ends the worker; scrape_channel sees it via await_unless_worker_died
+            writer.append(msg_dict)
+        finally:
+            queue.task_done()
+
+
+async def await_unless_worker_died(awaitable, workers):
+    """
+    Await a download queue put() or join(), but raise the error of a media
+    worker that died meanwhile instead of waiting on a queue nobody drains.
+    """
+    task = asyncio.ensure_future(awaitable)
+    done, _ = await asyncio.wait([task, *workers], return_when=asyncio.FIRST_COMPLETED)
+    if task in done:
+        return task.result()
+    task.cancel()
+    # Workers loop forever, so a finished one has died
+    for worker in workers:
+        if worker.done():
+            raise worker.exception() or RuntimeError("media download worker stopped")
+
+
+async def scrape_channel(client, channel_url, date_str, limiter=None, fingerprints=None):
+    """
+    Scrape one channel into the data lake. With a FingerprintStore, photos
+    are deduplicated against everything already stored.
+    Returns (new_message_count, message_ids_whose_media_failed).
+    """
     logger.info(f"Scraping channel: {channel_url}")
+    if limiter is None:
+        limiter = RateLimiter(SCRAPE_REQUESTS_PER_SECOND, SCRAPE_BURST)
+    workers = []
     try:
-        entity = await client.get_entity(channel_url)
+        entity = await call_with_flood_wait(limiter, client.get_entity, channel_url)
         channel_name = entity.username or channel_url.split("/")[-1]
         
-        messages_data = []
-        image_count = 0
+        new_count = 0
+        refreshed_count = 0
+        failed_media = []
+        # Only fetch messages newer than the last run's high-water mark
+        checkpoint = datalake.read_checkpoints(BASE_PATH).get(channel_name, 0)
+        max_message_id = checkpoint
+        logger.info(f"{channel_name}: fetching messages newer than id {checkpoint}")
         
         # Ensure image directory exists for this channel
         img_dir = datalake.channel_images_dir(BASE_PATH, channel_name)
 
-        async for message in client.iter_messages(entity, limit=100):
-            if not message:
-                continue
-            
-            msg_dict = {
-                "message_id": message.id,
-                "channel_name": channel_name,
-                "message_date": message.date.isoformat() if message.date else None,
-                "message_text": message.text,
-                "has_media": bool(message.media),
-                "image_path": None,
-                "views": message.views,
-                "forwards": message.forwards,
-            }
-
-            # Download image if present
-            if message.media and isinstance(message.media, MessageMediaPhoto):
-                # Naming convention: {message_id}.jpg
-                # Telethon download_media handles extension usually, but strict requirement: {message_id}.jpg
-                # We'll use download_media with file path
-                file_path = os.path.join(img_dir, f"{message.id}.jpg")
-                if not os.path.exists(file_path):
-                    await client.download_media(message.media, file=file_path)
-                    image_count += 1
-                msg_dict["image_path"] = str(file_path) # Store absolute path or relative? Req says path.
-            
-            messages_data.append(msg_dict)
+        # Messages stream straight into the partition; a same-day rerun only
+        # fetches new messages, so the earlier run's records are merged in
+        writer = datalake.open_channel_messages_writer(
+            base_path=BASE_PATH,
+            date_str=date_str,
+            channel_name=channel_name,
+            compression=LAKE_COMPRESSION,
+            merge_existing=True,
+            file_format=LAKE_FORMAT,
+        )
+        with writer:
+            # Message iteration only enqueues photos; the workers download them
+            download_queue = asyncio.Queue(maxsize=MEDIA_QUEUE_SIZE)
+            workers = [
+                asyncio.create_task(
+                    media_download_worker(client, limiter, download_queue, writer, failed_media, fingerprints)
+                )
+                for _ in range(max(1, MEDIA_DOWNLOAD_WORKERS))
+            ]
+
+            async def write_message(message):
+                msg_dict = {
+                    "message_id": message.id,
+                    "channel_name": channel_name,
+                    "message_date": message.date.isoformat() if message.date else None,
+                    "message_text": message.text,
+                    "has_media": bool(message.media),
+                    "image_path": None,
+                    "views": message.views,
+                    "forwards": message.forwards,
+                    "scraped_at": datetime.now(timezone.utc).isoformat(),
+                }
+
+                # Download image if present
+                if message.media and isinstance(message.media, MessageMediaPhoto):
+                    # Naming convention: {message_id}.jpg
+                    file_path = os.path.join(img_dir, f"{message.id}.jpg")
+                    if not os.path.exists(file_path):
+                        job = (msg_dict, message.media, file_path)
+                        if download_queue.full():
+                            await await_unless_worker_died(download_queue.put(job), workers)
+                        else:
+                            download_queue.put_nowait(job)
+                        return
+                    msg_dict["image_path"] = str(file_path)
+
+                writer.append(msg_dict)
+
+            async for message in iter_channel_messages(
+                client, entity, limiter, min_id=checkpoint
+            ):
+                if not message:
+                    continue
+                new_count += 1
+                max_message_id = max(max_message_id, message.id)
+                await write_message(message)
+
+            # Re-snapshot recent messages from earlier runs, newest first,
+            # until one is older than the refresh window
+            if checkpoint and ENGAGEMENT_REFRESH_DAYS > 0:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=ENGAGEMENT_REFRESH_DAYS)
+                async for message in iter_channel_messages(
+                    client, entity, limiter, offset_id=checkpoint + 1
+                ):
+                    if not message:
+                        continue
+                    if message.date is None or message.date < cutoff:
+                        break
+                    refreshed_count += 1
+                    await write_message(message)
+
+            # Finalize the partition only once every download succeeded or failed
+            await await_unless_worker_died(download_queue.join(), workers)
+            if failed_media:
+                logger.warning(f"{channel_name}: {len(failed_media)} media downloads failed")
+
+            if not new_count and not refreshed_count:
+                # Leave any earlier partition for today exactly as it was
+                writer.abort()
         
-        # Save to data lake
-        if messages_data:
-            datalake.write_channel_messages_json(
+        if new_count:
+            datalake.update_checkpoint(
                 base_path=BASE_PATH,
-                date_str=date_str,
                 channel_name=channel_name,
-                messages=messages_data
+                message_id=max_message_id,
             )
-            logger.info(f"Saved {len(messages_data)} messages for {channel_name} to data lake.")
+            logger.info(f"Saved {new_count} new messages for {channel_name} to {writer.path}")
         else:
-            logger.info(f"No messages found for {channel_name}")
+            logger.info(f"No new messages found for {channel_name}")
+        if refreshed_count:
+            logger.info(f"Refreshed engagement of {refreshed_count} recent messages for {channel_name}")
 
-        return len(messages_data)
+        return new_count, failed_media
 
     except Exception as e:
         logger.error(f"Error scraping {channel_url}: {e}", exc_info=True)
-        return 0
+        return 0, []
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+
+async def scrape_channels(client, channels, date_str, concurrency=SCRAPE_CONCURRENCY):
+    """
+    Scrape `channels` with at most `concurrency` running at once on one client.
+    Returns ({channel_url: message_count}, {channel_url: failed_media_ids}).
+    """
+    limiter = RateLimiter(SCRAPE_REQUESTS_PER_SECOND, SCRAPE_BURST)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    # One store shared by every channel, so reposts across channels are found
+    fingerprints = image_fingerprint.FingerprintStore(
+        datalake.image_fingerprints_path(BASE_PATH), datalake.telegram_image_blobs_dir(BASE_PATH)
+    ) if DEDUP_IMAGES else None
+
+    async def bounded(channel):
+        async with semaphore:
+            return await scrape_channel(client, channel, date_str, limiter, fingerprints)
+
+    try:
+        results = await asyncio.gather(*(bounded(channel) for channel in channels))
+    finally:
+        if fingerprints is not None:
+            stats = fingerprints.stats()
+            logger.info(
+                f"Images: {stats['images']} stored as {stats['unique_contents']} unique files "
+                f"in {stats['near_duplicate_groups']} near-duplicate groups"
+            )
+            fingerprints.close()
+    counts = {channel: count for channel, (count, _) in zip(channels, results)}
+    failures = {channel: failed for channel, (_, failed) in zip(channels, results) if failed}
+    return counts, failures
 
 async def main():
     if not API_ID or not API_HASH:
@@ -120,19 +438,15 @@ async def main():
         # However, 'client.start()' is interactive by default. 
     
     date_str = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    total_messages = 0
-    channel_counts = {}
-
-    for channel in CHANNELS:
-        count = await scrape_channel(client, channel, date_str)
-        channel_counts[channel] = count
-        total_messages += count
+    logger.info(f"Scraping {len(CHANNELS)} channels with concurrency {SCRAPE_CONCURRENCY}")
+    channel_counts, media_failures = await scrape_channels(client, CHANNELS, date_str)
 
     # Write manifest
     datalake.write_manifest(
         base_path=BASE_PATH,
         date_str=date_str,
-        channel_message_counts=channel_counts
+        channel_message_counts=channel_counts,
+        extra={"media_failures": media_failures} if media_failures else None,
     )
     
     logger.info("Scraping completed.")
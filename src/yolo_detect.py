@@ -1,28 +1,106 @@
 import os
+import csv
 import glob
-import pandas as pd
+import json
+import time
+import random
+import hashlib
+import shutil
+import argparse
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import cv2
+import numpy as np
+import torch
 from ultralytics import YOLO
 
+import detection_cache
+import detector_backends
+import image_cache
+import image_fingerprint
+
 # Paths
 BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 IMAGE_DIR = os.path.join(BASE_PATH, "data", "raw", "images")
+IMAGE_CACHE_DIR = os.path.join(BASE_PATH, "data", "raw", "image_cache")
+BLOB_DIR = os.path.join(BASE_PATH, "data", "raw", "image_blobs")
+FINGERPRINTS_PATH = os.path.join(BASE_PATH, "data", "raw", "image_fingerprints.sqlite")
 OUTPUT_CSV = os.path.join(BASE_PATH, "data", "yolo_results.csv")
+BOXES_CSV = os.path.join(BASE_PATH, "data", "yolo_boxes.csv")
+# Rows are appended here as detection runs; renamed to OUTPUT_CSV/BOXES_CSV on completion
+PARTIAL_CSV = f"{OUTPUT_CSV}.part"
+PARTIAL_BOXES_CSV = f"{BOXES_CSV}.part"
+CACHE_PATH = os.path.join(BASE_PATH, "data", "yolo_cache.sqlite")
+SHARD_DIR = os.path.join(BASE_PATH, "data", "yolo_shards")
+MODELS_DIR = os.path.join(BASE_PATH, "data", "models")
+BACKEND_REPORT = os.path.join(BASE_PATH, "data", "backend_report.json")
+CSV_COLUMNS = ['message_id', 'channel_name', 'detected_class', 'confidence_score', 'image_category']
+SUMMARY_COLUMNS = ['detected_class', 'confidence_score', 'image_category']
+BOX_COLUMNS = ['message_id', 'channel_name', 'box_index', 'detected_class', 'confidence_score', 'x1', 'y1', 'x2', 'y2']
+
+# Classes that make an image promotional/product/lifestyle content
+PERSON_CLASSES = np.array(['person'])
+# Define 'product' as bottle, cup, vase, or bowl (common containers)
+PRODUCT_CLASSES = np.array(['bottle', 'cup', 'vase', 'bowl'])
+
+# Batched inference: images per model.predict call and JPEG decode threads
+BATCH_SIZE = int(os.getenv("YOLO_BATCH_SIZE", "16"))
+PREFETCH_WORKERS = int(os.getenv("YOLO_PREFETCH_WORKERS", "4"))
+# Decoded images held while waiting for same-shape batches, in batches
+MAX_BUFFERED_BATCHES = int(os.getenv("YOLO_MAX_BUFFERED_BATCHES", "4"))
+# Detection processes; each loads the model once and gets cpu_count // workers torch threads
+DETECT_WORKERS = int(os.getenv("YOLO_WORKERS", "1"))
+
+# Inference runtime: torch, onnx or openvino (YOLO_INT8=1 quantizes openvino)
+DETECT_BACKEND = os.getenv("YOLO_BACKEND", "torch")
+DETECT_INT8 = os.getenv("YOLO_INT8", "") == "1"
+
+# Detect on the 640px letterboxed copies in IMAGE_CACHE_DIR (built on demand
+# when the scraper has not made them) instead of decoding full originals
+USE_IMAGE_CACHE = os.getenv("YOLO_IMAGE_CACHE", "1") == "1"
+# Near-duplicate images (same size, dHash within a few bits) share one inference
+USE_NEAR_DUPLICATES = os.getenv("YOLO_NEAR_DUPLICATES", "1") == "1"
+
+# YOLOv8 nano model, loaded on first use so each worker process loads it once
+MODEL_WEIGHTS = 'yolov8n.pt'
+_model = None
+
+
+def configure_backend(backend, int8=False):
+    """Switch the runtime used by get_model(); the next call reloads."""
+    global DETECT_BACKEND, DETECT_INT8, _model
+    DETECT_BACKEND, DETECT_INT8 = backend, int8
+    _model = None
 
-# Load YOLOv8 nano model
-model = YOLO('yolov8n.pt')
 
-def classify_image(detections):
+def get_model():
+    global _model
+    if _model is None:
+        # Non-torch backends are exported once and cached under MODELS_DIR
+        _model = detector_backends.load_detector(
+            MODEL_WEIGHTS, DETECT_BACKEND, DETECT_INT8, export_dir=MODELS_DIR, image_dir=IMAGE_DIR
+        )
+    return _model
+
+
+def get_model_version():
+    # Cached detections are only reused for the exact same weights, runtime and input
+    get_model()
+    version = detector_backends.detector_version(MODEL_WEIGHTS, DETECT_BACKEND, DETECT_INT8)
+    return f"{version}:lb{image_cache.DETECT_SIZE}" if USE_IMAGE_CACHE else version
+
+def classify_image(class_names):
     """
-    Categorize image based on detected objects:
+    Categorize image based on detected objects (an array of class names):
     - promotional: Contains person + product
     - product_display: Contains bottle/container, no person
     - lifestyle: Contains person, no product
     - other: Neither detected
     """
-    has_person = any(d['name'] == 'person' for d in detections)
-    # Define 'product' as bottle, cup, vase, or bowl (common containers)
-    product_classes = ['bottle', 'cup', 'vase', 'bowl']
-    has_product = any(d['name'] in product_classes for d in detections)
+    class_names = np.asarray(class_names)
+    has_person = np.isin(class_names, PERSON_CLASSES).any()
+    has_product = np.isin(class_names, PRODUCT_CLASSES).any()
     
     if has_person and has_product:
         return 'promotional'
@@ -33,59 +111,557 @@ def classify_image(detections):
     else:
         return 'other'
 
-def run_detection():
-    # Find all images
-    image_paths = glob.glob(os.path.join(IMAGE_DIR, "**", "*.jpg"), recursive=True)
-    results_data = []
-    
-    print(f"Found {len(image_paths)} images to process.")
-    
-    for img_path in image_paths:
-        # Extract metadata from path
-        # Expected path: .../data/raw/images/{channel_name}/{message_id}.jpg
-        parts = os.path.normpath(img_path).split(os.sep)
-        channel_name = parts[-2]
-        message_id = os.path.splitext(parts[-1])[0]
-        
-        # Run YOLO detection (remove unsupported 'quiet' arg)
+def image_metadata(img_path):
+    """(channel_name, message_id) from .../data/raw/images/{channel_name}/{message_id}.jpg"""
+    parts = os.path.normpath(img_path).split(os.sep)
+    return parts[-2], os.path.splitext(parts[-1])[0]
+
+
+def unletterbox(xyxy, geometry):
+    """Map xyxy boxes on a letterboxed cache copy back to original pixel coordinates."""
+    width, height, scale, _, _, pad_x, pad_y = geometry
+    xyxy = (xyxy - np.array([pad_x, pad_y, pad_x, pad_y])) / scale
+    return np.clip(xyxy, 0, [width, height, width, height])
+
+
+def detection_arrays(result, geometry=None):
+    """
+    Class names, confidences and xyxy boxes of one result, straight from its
+    tensors. Boxes found on a letterboxed copy are mapped back using `geometry`.
+    """
+    boxes = result.boxes
+    names = np.array([result.names[i] for i in range(len(result.names))])
+    xyxy = boxes.xyxy.cpu().numpy()
+    return {
+        'class_names': names[boxes.cls.cpu().numpy().astype(np.int64)],
+        'confidences': boxes.conf.cpu().numpy(),
+        'xyxy': xyxy if geometry is None else unletterbox(xyxy, geometry),
+    }
+
+
+def summarize_detections(arrays):
+    """
+    Reduce an image's detection arrays to the cached summary fields plus
+    every box as [class, confidence, x1, y1, x2, y2].
+    """
+    class_names, confidences = arrays['class_names'], arrays['confidences']
+
+    # Determine category
+    category = classify_image(class_names)
+
+    # Get primary detection (highest confidence) for the 'detected_class' field
+    if len(class_names):
+        primary = int(np.argmax(confidences))
+        det_class = str(class_names[primary])
+        conf_score = float(confidences[primary])
+    else:
+        det_class = 'none'
+        conf_score = 0.0
+
+    return {
+        'detected_class': det_class,
+        'confidence_score': conf_score,
+        'image_category': category,
+        'boxes': [
+            [name, conf, *xyxy]
+            for name, conf, xyxy in zip(class_names.tolist(), confidences.tolist(), arrays['xyxy'].round(2).tolist())
+        ],
+    }
+
+
+def build_result_row(img_path, summary):
+    channel_name, message_id = image_metadata(img_path)
+    return {'message_id': message_id, 'channel_name': channel_name, **{c: summary[c] for c in SUMMARY_COLUMNS}}
+
+
+def build_box_rows(img_path, summary):
+    channel_name, message_id = image_metadata(img_path)
+    return [
+        {'message_id': message_id, 'channel_name': channel_name, 'box_index': i,
+         **dict(zip(BOX_COLUMNS[3:], box))}
+        for i, box in enumerate(summary['boxes'])
+    ]
+
+
+def load_image(img_path):
+    """
+    Decode an image the same way ultralytics does for a path source (BGR).
+    With the image cache, the letterboxed copy is decoded instead. Returns
+    (image, geometry); geometry is (width, height, *letterbox_geometry) of
+    the original for cached copies and None for originals.
+    """
+    source, geometry = img_path, None
+    if USE_IMAGE_CACHE:
+        cached_path = image_cache.ensure_detect_copy(img_path, IMAGE_DIR, IMAGE_CACHE_DIR)
+        if cached_path is not None:
+            width, height = image_cache.original_size(img_path)
+            source, geometry = cached_path, (width, height, *image_cache.letterbox_geometry(width, height))
+    img = cv2.imread(source)
+    if img is None:
+        raise ValueError("image could not be decoded")
+    return img, geometry
+
+
+def iter_decoded_images(image_paths, workers=PREFETCH_WORKERS, lookahead=64):
+    """
+    Yield (img_path, (image, geometry) or exception) in order while a thread
+    pool decodes up to `lookahead` images ahead of inference.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = []
+        for img_path in image_paths:
+            pending.append((img_path, pool.submit(load_image, img_path)))
+            if len(pending) >= lookahead:
+                img_path, future = pending.pop(0)
+                yield img_path, future.exception() or future.result()
+        for img_path, future in pending:
+            yield img_path, future.exception() or future.result()
+
+
+def iter_image_batches(decoded, batch_size, max_buffered=None):
+    """
+    Group decoded images into batches of identical shape. ultralytics only
+    uses the minimal-padding letterbox when every image in a batch has the
+    same shape, so this keeps per-image results identical to one-at-a-time
+    inference. Undecodable images come through as 1-item error batches.
+
+    At most `max_buffered` decoded images (default 4 batches) are held across
+    the shape buckets; past that the fullest bucket (the oldest on ties) is
+    flushed as a partial batch, so rare shapes don't pin memory.
+    """
+    if max_buffered is None:
+        max_buffered = MAX_BUFFERED_BATCHES * batch_size
+    max_buffered = max(batch_size, max_buffered)
+    buckets = {}
+    buffered = 0
+    for img_path, item in decoded:
+        if isinstance(item, Exception):
+            yield [(img_path, item)]
+            continue
+        shape = item[0].shape
+        bucket = buckets.setdefault(shape, [])
+        bucket.append((img_path, item))
+        buffered += 1
+        if len(bucket) >= batch_size:
+            buffered -= len(bucket)
+            yield buckets.pop(shape)
+        elif buffered >= max_buffered:
+            # max() returns the first of equally full buckets, i.e. the oldest
+            fullest = max(buckets, key=lambda key: len(buckets[key]))
+            buffered -= len(buckets[fullest])
+            yield buckets.pop(fullest)
+    yield from buckets.values()
+
+
+def infer_images(image_paths, batch_size=BATCH_SIZE, prefetch_workers=PREFETCH_WORKERS):
+    """Yield (img_path, summary) for every decodable image, batching inference."""
+    model = get_model()
+    decoded = iter_decoded_images(image_paths, workers=prefetch_workers)
+    for batch in iter_image_batches(decoded, max(1, batch_size)):
+        img_path, first = batch[0]
+        if isinstance(first, Exception):
+            print(f"Skipping image {img_path} due to read/prediction error: {first}")
+            continue
+
+        # Run YOLO detection on the whole batch
         try:
-            results = model(img_path)
+            results = model.predict([img for _, (img, _) in batch], batch=len(batch))
         except Exception as e:
-            print(f"Skipping image {img_path} due to read/prediction error: {e}")
+            print(f"Skipping batch of {len(batch)} images starting at {img_path} due to prediction error: {e}")
+            continue
+
+        for (img_path, (_, geometry)), result in zip(batch, results):
+            yield img_path, summarize_detections(detection_arrays(result, geometry))
+
+
+def _init_detect_worker(torch_threads, backend, int8, use_image_cache):
+    global USE_IMAGE_CACHE
+    # Split the cores between workers instead of every process using all of them
+    torch.set_num_threads(torch_threads)
+    configure_backend(backend, int8)
+    USE_IMAGE_CACHE = use_image_cache
+    get_model()
+
+
+def detect_shard(shard_path, image_keys, batch_size, prefetch_workers):
+    """
+    Worker task: run inference over one shard of (img_path, key) pairs,
+    flushing each result to the shard's CSV as it is made.
+    """
+    key_by_path = dict(image_keys)
+    with open(shard_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(['image_path', 'key'] + SUMMARY_COLUMNS + ['boxes'])
+        for img_path, summary in infer_images(list(key_by_path), batch_size, prefetch_workers):
+            writer.writerow(
+                [img_path, key_by_path[img_path]] + [summary[c] for c in SUMMARY_COLUMNS] + [json.dumps(summary['boxes'])]
+            )
+            f.flush()
+    return shard_path
+
+
+def read_shard_rows(shard_path):
+    """
+    Yield (img_path, key, summary) for every complete row of a shard CSV.
+    A worker that was killed can leave a partial last row; it is skipped.
+    """
+    with open(shard_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        while True:
+            try:
+                row = next(reader)
+            except (StopIteration, csv.Error):
+                return
+            try:
+                summary = {
+                    'detected_class': row['detected_class'],
+                    'confidence_score': float(row['confidence_score']),
+                    'image_category': row['image_category'],
+                    'boxes': json.loads(row['boxes']),
+                }
+            except (TypeError, ValueError):
+                continue
+            yield row['image_path'], row['key'], summary
+
+
+def infer_images_sharded(image_paths, hash_by_path, workers, model_version, batch_size=BATCH_SIZE,
+                         prefetch_workers=PREFETCH_WORKERS):
+    """
+    Shard images by content hash across `workers` processes and yield
+    (img_path, summary) from each shard file as soon as its worker is done.
+
+    Shard files are kept under SHARD_DIR (one directory per model version)
+    until the run has consumed them all, so after an interruption the
+    results finished so far are reused for images whose key still matches
+    and only the rest are sharded again.
+    """
+    shard_dir = os.path.join(SHARD_DIR, hashlib.sha256(model_version.encode()).hexdigest()[:16])
+    if os.path.isdir(SHARD_DIR):
+        # Shards of another model version can't be reused
+        for name in os.listdir(SHARD_DIR):
+            if os.path.join(SHARD_DIR, name) != shard_dir:
+                shutil.rmtree(os.path.join(SHARD_DIR, name), ignore_errors=True)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    remaining = set(image_paths)
+    resumed = 0
+    for name in sorted(os.listdir(shard_dir)):
+        for img_path, key, summary in read_shard_rows(os.path.join(shard_dir, name)):
+            if img_path in remaining and hash_by_path[img_path] == key:
+                remaining.discard(img_path)
+                resumed += 1
+                yield img_path, summary
+    if resumed:
+        print(f"Reused {resumed} results from an interrupted sharded run")
+
+    shards = [[] for _ in range(workers)]
+    for img_path in image_paths:
+        if img_path in remaining:
+            shards[int(hash_by_path[img_path][:8], 16) % workers].append((img_path, hash_by_path[img_path]))
+
+    if any(shards):
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"Running {workers} detection workers with {torch_threads} torch thread(s) each")
+        # New names, so shards of an interrupted run are not overwritten
+        run_id = f"{int(time.time())}_{os.getpid()}"
+
+        # spawn, not fork: forking a process that already holds torch threads can deadlock
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_detect_worker,
+            initargs=(torch_threads, DETECT_BACKEND, DETECT_INT8, USE_IMAGE_CACHE),
+        ) as pool:
+            futures = [
+                pool.submit(
+                    detect_shard,
+                    os.path.join(shard_dir, f"shard_{run_id}_{i:03d}.csv"),
+                    shard,
+                    batch_size,
+                    prefetch_workers,
+                )
+                for i, shard in enumerate(shards)
+                if shard
+            ]
+            for future in as_completed(futures):
+                for img_path, _, summary in read_shard_rows(future.result()):
+                    yield img_path, summary
+    shutil.rmtree(SHARD_DIR, ignore_errors=True)
+
+
+def near_duplicate_key(fingerprints, img_path, content_hash):
+    """Canonical content hash shared by an image's near duplicates (its own hash if unreadable)."""
+    try:
+        return fingerprints.canonical_hash(img_path, content_hash)
+    except Exception:
+        return content_hash
+
+
+def iter_cached_detections(image_paths, cache, model_version, batch_size=BATCH_SIZE,
+                           prefetch_workers=PREFETCH_WORKERS, workers=1, before_commit=None,
+                           fingerprints=None):
+    """
+    Yield (img_path, summary, fresh) for every decodable image, serving
+    cached results by (content hash, model version) and inferring the rest.
+    `fresh` is True for images that are new/changed on disk or were
+    inferred now. `workers` > 1 shards inference across processes. With a
+    FingerprintStore, near duplicates share their canonical image's result.
+
+    The cache is committed every `batch_size` results; `before_commit` is
+    called first so callers can persist what they were yielded.
+    """
+    def commit():
+        if before_commit is not None:
+            before_commit()
+        cache.commit()
+
+    # Identical (and with fingerprints, near-identical) content is inferred
+    # once, whatever its path: {key: [(img_path, content_hash), ...]}
+    pending = {}
+    reused = 0
+    for img_path in image_paths:
+        content_hash, changed = cache.content_hash(img_path)
+        cached = cache.get(content_hash, model_version)
+        if cached is not None:
+            yield img_path, cached, changed
+            continue
+
+        key = content_hash
+        if fingerprints is not None:
+            key = near_duplicate_key(fingerprints, img_path, content_hash)
+            if key != content_hash:
+                cached = cache.get(key, model_version)
+        if cached is not None:
+            cache.put(content_hash, model_version, cached)
+            reused += 1
+            yield img_path, cached, True
+        else:
+            pending.setdefault(key, []).append((img_path, content_hash))
+    commit()
+
+    print(
+        f"Found {len(image_paths)} images; {len(pending)} need inference "
+        f"(batch size {batch_size}), {reused} reuse a near duplicate's result, "
+        f"the rest are cached for {model_version}."
+    )
+
+    to_infer = [members[0][0] for members in pending.values()]
+    key_by_path = {members[0][0]: key for key, members in pending.items()}
+
+    if workers > 1 and len(to_infer) > 1:
+        inferred = infer_images_sharded(to_infer, key_by_path, workers, model_version, batch_size, prefetch_workers)
+    else:
+        inferred = infer_images(to_infer, batch_size, prefetch_workers)
+
+    for done, (img_path, summary) in enumerate(inferred, start=1):
+        key = key_by_path[img_path]
+        cache.put(key, model_version, summary)
+        for path, content_hash in pending[key]:
+            if content_hash != key:
+                cache.put(content_hash, model_version, summary)
+            yield path, summary, True
+        if done % max(1, batch_size) == 0:
+            commit()
+    commit()
+
+
+@contextmanager
+def partial_csv_writers():
+    """
+    Open the .part files for appending (writing headers to new ones) and
+    yield (write_rows, checkpoint): write_rows(img_path, summary) appends an
+    image's summary and box rows and returns its box count, checkpoint()
+    flushes both files to disk. Call checkpoint before committing the
+    detection cache, or a crash would leave results that no CSV holds.
+    """
+    with open(PARTIAL_CSV, "a", newline="", encoding="utf-8") as f, \
+            open(PARTIAL_BOXES_CSV, "a", newline="", encoding="utf-8") as boxes_f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, lineterminator="\n")
+        boxes_writer = csv.DictWriter(boxes_f, fieldnames=BOX_COLUMNS, lineterminator="\n")
+        if f.tell() == 0:
+            writer.writeheader()
+        if boxes_f.tell() == 0:
+            boxes_writer.writeheader()
+
+        def write_rows(img_path, summary):
+            writer.writerow(build_result_row(img_path, summary))
+            box_rows = build_box_rows(img_path, summary)
+            boxes_writer.writerows(box_rows)
+            return len(box_rows)
+
+        def checkpoint():
+            for out in (f, boxes_f):
+                out.flush()
+                os.fsync(out.fileno())
+
+        yield write_rows, checkpoint
+        checkpoint()
+
+
+def carry_over_unloaded_rows():
+    """
+    Append to the .part files the rows of a previous OUTPUT_CSV/BOXES_CSV
+    that the loader has not consumed yet, except for images this run wrote
+    again. The loader deletes the CSVs once loaded, so an unloaded delta is
+    merged into the next one instead of being overwritten.
+    """
+    with open(PARTIAL_CSV, newline="", encoding="utf-8") as f:
+        written = {(row["message_id"], row["channel_name"]) for row in csv.DictReader(f)}
+    carried = 0
+    for previous, partial, columns in ((OUTPUT_CSV, PARTIAL_CSV, CSV_COLUMNS), (BOXES_CSV, PARTIAL_BOXES_CSV, BOX_COLUMNS)):
+        if not os.path.exists(previous):
             continue
-        
-        detections = []
-        for result in results:
-            for box in result.boxes:
-                cls_id = int(box.cls[0])
-                name = model.names[cls_id]
-                conf = float(box.conf[0])
-                detections.append({'name': name, 'conf': conf})
-        
-        # Determine category
-        category = classify_image(detections)
-        
-        # Get primary detection (highest confidence) for the 'detected_class' field
-        if detections:
-            primary = max(detections, key=lambda x: x['conf'])
-            det_class = primary['name']
-            conf_score = primary['conf']
+        with open(previous, newline="", encoding="utf-8") as src, \
+                open(partial, "a", newline="", encoding="utf-8") as dst:
+            writer = csv.DictWriter(dst, fieldnames=columns, lineterminator="\n")
+            for row in csv.DictReader(src):
+                if (row["message_id"], row["channel_name"]) not in written:
+                    writer.writerow(row)
+                    carried += partial == PARTIAL_CSV
+            dst.flush()
+            os.fsync(dst.fileno())
+    return carried
+
+
+def run_detection(batch_size=BATCH_SIZE, prefetch_workers=PREFETCH_WORKERS, full_export=False, workers=DETECT_WORKERS):
+    """
+    Detect objects in new or changed images only. Results are cached by
+    (image content hash, model version); the CSVs receive rows for images
+    that are new/changed on disk or were inferred this run, or every image
+    with `full_export`: one summary row per image in OUTPUT_CSV and one row
+    per detected box in BOXES_CSV. `workers` > 1 shards inference across
+    processes.
+
+    Rows are streamed to the .part files and flushed before every cache
+    commit, so an interrupted run keeps its rows and the next run appends
+    to them, inferring only what was not yet committed. Rows the detection
+    service's /detect appended are exported the same way, and rows of an
+    earlier run the loader has not consumed are carried over. Returns the number
+    of summary rows written by this run.
+    """
+    # Find all images
+    image_paths = glob.glob(os.path.join(IMAGE_DIR, "**", "*.jpg"), recursive=True)
+    model_version = get_model_version()
+
+    if os.path.exists(PARTIAL_CSV):
+        print(f"Resuming from pending results in {PARTIAL_CSV}")
+    rows = boxes = 0
+    with partial_csv_writers() as (write_rows, checkpoint):
+        fingerprints = image_fingerprint.FingerprintStore(FINGERPRINTS_PATH, BLOB_DIR) if USE_NEAR_DUPLICATES else None
+        try:
+            with detection_cache.DetectionCache(CACHE_PATH) as cache:
+                for img_path, summary, fresh in iter_cached_detections(
+                    image_paths, cache, model_version, batch_size, prefetch_workers, workers,
+                    before_commit=checkpoint, fingerprints=fingerprints,
+                ):
+                    if fresh or full_export:
+                        boxes += write_rows(img_path, summary)
+                        rows += 1
+        finally:
+            if fingerprints is not None:
+                fingerprints.close()
+
+    carried = carry_over_unloaded_rows()
+    if carried:
+        print(f"Kept {carried} results from an earlier run that were not loaded yet")
+    os.replace(PARTIAL_BOXES_CSV, BOXES_CSV)
+    os.replace(PARTIAL_CSV, OUTPUT_CSV)
+    print(f"Detection completed. {rows} new/changed results saved to {OUTPUT_CSV} ({boxes} boxes in {BOXES_CSV})")
+    return rows
+
+
+def compare_backends(labels, sample_size=100, report_path=BACKEND_REPORT, seed=0):
+    """
+    Run a seeded sample of images through each backend and compare latency
+    and results against the PyTorch baseline. Writes a JSON report.
+    """
+    image_paths = sorted(glob.glob(os.path.join(IMAGE_DIR, "**", "*.jpg"), recursive=True))
+    sample = random.Random(seed).sample(image_paths, min(sample_size, len(image_paths)))
+    images = [(p, item) for p, item in iter_decoded_images(sample) if not isinstance(item, Exception)]
+    if not images:
+        print("No images to compare backends on.")
+        return None
+
+    labels = ["torch"] + [label for label in labels if label != "torch"]
+    report = {"sample_size": len(images), "backends": {}}
+    baseline = None
+    for label in labels:
+        configure_backend(*detector_backends.parse_backend_label(label))
+        model = get_model()
+        model.predict(images[0][1][0], verbose=False)  # warm-up
+
+        latencies = []
+        summaries = {}
+        for img_path, (img, geometry) in images:
+            start = time.perf_counter()
+            results = model.predict(img, verbose=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+            summaries[img_path] = summarize_detections(detection_arrays(results[0], geometry))
+
+        latencies.sort()
+        stats = {
+            "mean_ms": sum(latencies) / len(latencies),
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        }
+        if baseline is None:
+            baseline = summaries
         else:
-            det_class = 'none'
-            conf_score = 0.0
-            
-        results_data.append({
-            'message_id': message_id,
-            'channel_name': channel_name,
-            'detected_class': det_class,
-            'confidence_score': conf_score,
-            'image_category': category
-        })
-        
-    # Save to CSV
-    df = pd.DataFrame(results_data)
-    df.to_csv(OUTPUT_CSV, index=False)
-    print(f"Detection completed. Results saved to {OUTPUT_CSV}")
+            same_class = [p for p in summaries if summaries[p]['detected_class'] == baseline[p]['detected_class']]
+            stats["detected_class_agreement"] = len(same_class) / len(summaries)
+            stats["image_category_agreement"] = sum(
+                summaries[p]['image_category'] == baseline[p]['image_category'] for p in summaries
+            ) / len(summaries)
+            stats["mean_abs_confidence_diff"] = (
+                sum(abs(summaries[p]['confidence_score'] - baseline[p]['confidence_score']) for p in same_class)
+                / len(same_class)
+                if same_class else None
+            )
+        stats["speedup_vs_torch"] = report["backends"]["torch"]["mean_ms"] / stats["mean_ms"] if report["backends"] else 1.0
+        report["backends"][label] = stats
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\nBackend comparison on {len(images)} images (baseline: torch)")
+    print(f"{'backend':<16}{'mean ms':>10}{'p95 ms':>10}{'speedup':>9}{'class agr':>11}{'category agr':>14}")
+    for label, stats in report["backends"].items():
+        class_agr = stats.get("detected_class_agreement")
+        category_agr = stats.get("image_category_agreement")
+        print(
+            f"{label:<16}{stats['mean_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['speedup_vs_torch']:>8.2f}x"
+            f"{'' if class_agr is None else f'{class_agr:.1%}':>11}"
+            f"{'' if category_agr is None else f'{category_agr:.1%}':>14}"
+        )
+    print(f"Report saved to {report_path}")
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run YOLO detection over scraped images.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Images per model.predict call")
+    parser.add_argument("--prefetch-workers", type=int, default=PREFETCH_WORKERS, help="Threads decoding images ahead of inference")
+    parser.add_argument("--workers", type=int, default=DETECT_WORKERS, help="Detection processes to shard images across")
+    parser.add_argument("--backend", choices=detector_backends.BACKENDS, default=DETECT_BACKEND, help="Inference runtime")
+    parser.add_argument("--int8", action="store_true", default=DETECT_INT8, help="INT8-quantize (openvino), calibrated on our own images")
+    parser.add_argument("--compare-backends", help="Comma-separated backends to benchmark against torch, e.g. onnx,openvino,openvino-int8")
+    parser.add_argument("--compare-sample", type=int, default=100, help="Images used by --compare-backends")
+    parser.add_argument("--full-export", action="store_true", help="Write every image's result to the CSV, not only new/changed ones")
+    parser.add_argument("--no-image-cache", action="store_true", help="Decode full-resolution originals instead of the 640px cached copies")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    run_detection()
+    args = parse_args()
+    if args.no_image_cache:
+        USE_IMAGE_CACHE = False
+    if args.compare_backends:
+        compare_backends(args.compare_backends.split(","), sample_size=args.compare_sample)
+        raise SystemExit(0)
+    configure_backend(args.backend, args.int8)
+    run_detection(
+        batch_size=args.batch_size,
+        prefetch_workers=args.prefetch_workers,
+        full_export=args.full_export,
+        workers=args.workers,
+    )
@@ -5,6 +5,12 @@ import unittest
 from datetime import datetime
 from src import datalake
 
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
 class TestDataLake(unittest.TestCase):
     def setUp(self):
         self.test_base_path = "test_data_lake"
@@ -52,5 +58,160 @@ class TestDataLake(unittest.TestCase):
             self.assertEqual(data["total_messages"], 1)
             self.assertEqual(data["channels"], counts)
 
+    def test_manifest_indexes_partition_files(self):
+        for channel, ids, day in (("chan_a", [1, 5], "01"), ("chan_b", [100, 120], "02")):
+            datalake.write_channel_messages_json(
+                base_path=self.test_base_path,
+                date_str="2024-01-01",
+                channel_name=channel,
+                messages=[
+                    {"message_id": i, "message_date": f"2024-01-{day}T08:00:00+00:00"} for i in ids
+                ],
+            )
+
+        path = datalake.write_manifest(
+            base_path=self.test_base_path,
+            date_str="2024-01-01",
+            channel_message_counts={"chan_a": 2, "chan_b": 2},
+        )
+
+        with open(path, "r", encoding="utf-8") as f:
+            stats = json.load(f)["files"]["chan_b.json"]
+        self.assertEqual(stats["rows"], 2)
+        self.assertEqual((stats["min_message_id"], stats["max_message_id"]), (100, 120))
+        self.assertEqual(stats["min_message_date"], "2024-01-02T08:00:00+00:00")
+        self.assertEqual(len(stats["sha256"]), 64)
+
+        def names(paths):
+            return [os.path.basename(p) for p in paths]
+
+        query = datalake.query_lake_index
+        self.assertEqual(names(query(self.test_base_path)), ["chan_a.json", "chan_b.json"])
+        self.assertEqual(names(query(self.test_base_path, channel_name="chan_a")), ["chan_a.json"])
+        self.assertEqual(names(query(self.test_base_path, start_date="2024-01-02")), ["chan_b.json"])
+        self.assertEqual(names(query(self.test_base_path, max_message_id=50)), ["chan_a.json"])
+        self.assertEqual(query(self.test_base_path, min_message_id=121), [])
+
+    def test_checkpoints_roundtrip(self):
+        self.assertEqual(datalake.read_checkpoints(self.test_base_path), {})
+
+        datalake.update_checkpoint(
+            base_path=self.test_base_path, channel_name="test_channel", message_id=42
+        )
+        # Lower ids never move the high-water mark backwards
+        datalake.update_checkpoint(
+            base_path=self.test_base_path, channel_name="test_channel", message_id=7
+        )
+
+        self.assertEqual(
+            datalake.read_checkpoints(self.test_base_path), {"test_channel": 42}
+        )
+
+    def test_streaming_writer_roundtrip(self):
+        messages = [{"message_id": i, "message_text": f"msg {i}"} for i in range(3)]
+
+        for compression in (None, "gzip"):
+            with datalake.open_channel_messages_writer(
+                base_path=self.test_base_path,
+                date_str="2024-01-01",
+                channel_name="test_channel",
+                compression=compression,
+            ) as writer:
+                for msg in messages:
+                    writer.append(msg)
+
+            self.assertTrue(writer.path.endswith(".jsonl" + datalake.COMPRESSION_SUFFIXES[compression]))
+            self.assertFalse(os.path.exists(writer.tmp_path))
+            self.assertEqual(list(datalake.iter_channel_messages(writer.path)), messages)
+
+    def test_streaming_writer_aborts_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with datalake.open_channel_messages_writer(
+                base_path=self.test_base_path,
+                date_str="2024-01-01",
+                channel_name="test_channel",
+            ) as writer:
+                writer.append({"message_id": 1})
+                raise RuntimeError("scrape died")
+
+        self.assertFalse(os.path.exists(writer.path))
+        self.assertFalse(os.path.exists(writer.tmp_path))
+
+    def test_streaming_writer_merges_legacy_json(self):
+        legacy_path = datalake.write_channel_messages_json(
+            base_path=self.test_base_path,
+            date_str="2024-01-01",
+            channel_name="test_channel",
+            messages=[{"message_id": 1}],
+        )
+
+        with datalake.open_channel_messages_writer(
+            base_path=self.test_base_path,
+            date_str="2024-01-01",
+            channel_name="test_channel",
+            merge_existing=True,
+        ) as writer:
+            writer.append({"message_id": 2})
+
+        self.assertFalse(os.path.exists(legacy_path))
+        self.assertEqual(datalake.list_messages_files(self.test_base_path), [writer.path])
+        self.assertEqual(
+            [m["message_id"] for m in datalake.iter_channel_messages(writer.path)], [1, 2]
+        )
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow not installed")
+    def test_parquet_writer_roundtrip(self):
+        messages = [
+            {
+                "message_id": i,
+                "channel_name": "test_channel",
+                "message_date": "2024-01-01T10:00:00+00:00",
+                "message_text": f"msg {i}",
+                "has_media": False,
+                "image_path": None,
+                "views": 10 * i,
+                "forwards": i,
+                "scraped_at": "2024-01-02T00:00:00+00:00",
+            }
+            for i in range(1, 4)
+        ]
+        with datalake.open_channel_messages_writer(
+            base_path=self.test_base_path,
+            date_str="2024-01-01",
+            channel_name="test_channel",
+            file_format="parquet",
+        ) as writer:
+            for msg in messages:
+                writer.append(msg)
+
+        self.assertTrue(writer.path.endswith(".parquet"))
+        self.assertEqual(list(datalake.iter_channel_messages(writer.path)), messages)
+
+        table = datalake.read_messages_table(
+            [writer.path], columns=["message_id", "views"], filters=[("views", ">", 10)]
+        )
+        self.assertEqual(table.to_pylist(), [{"message_id": 2, "views": 20}, {"message_id": 3, "views": 30}])
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow not installed")
+    def test_compact_month(self):
+        for day, views in (("2024-01-01", 5), ("2024-01-02", 50)):
+            datalake.write_channel_messages_json(
+                base_path=self.test_base_path,
+                date_str=day,
+                channel_name="test_channel",
+                messages=[
+                    {"message_id": 2, "channel_name": "test_channel", "views": views},
+                    {"message_id": 1, "channel_name": "test_channel", "views": views},
+                ],
+            )
+
+        written = datalake.compact_month(base_path=self.test_base_path, month_str="2024-01")
+
+        self.assertEqual(len(written), 1)
+        self.assertEqual(datalake.list_messages_files(self.test_base_path), written)
+        rows = list(datalake.iter_channel_messages(written[0], columns=["message_id", "views"]))
+        # Sorted by id, and the later day's scrape wins
+        self.assertEqual(rows, [{"message_id": 1, "views": 50}, {"message_id": 2, "views": 50}])
+
 if __name__ == "__main__":
     unittest.main()
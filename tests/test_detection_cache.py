@@ -0,0 +1,53 @@
+import os
+import shutil
+import time
+import unittest
+from src import detection_cache
+
+
+class TestDetectionCache(unittest.TestCase):
+    def setUp(self):
+        self.test_base_path = "test_detection_cache"
+        os.makedirs(self.test_base_path, exist_ok=True)
+        self.image_path = os.path.join(self.test_base_path, "1.jpg")
+        with open(self.image_path, "wb") as f:
+            f.write(b"fake jpeg bytes")
+
+    def tearDown(self):
+        if os.path.exists(self.test_base_path):
+            shutil.rmtree(self.test_base_path)
+
+    def test_content_hash_tracks_changes(self):
+        with detection_cache.DetectionCache(os.path.join(self.test_base_path, "cache.sqlite")) as cache:
+            first, changed = cache.content_hash(self.image_path)
+            self.assertTrue(changed)
+            self.assertEqual(cache.content_hash(self.image_path), (first, False))
+
+            time.sleep(0.01)
+            with open(self.image_path, "wb") as f:
+                f.write(b"different bytes")
+            second, changed = cache.content_hash(self.image_path)
+            self.assertTrue(changed)
+            self.assertNotEqual(first, second)
+
+    def test_results_keyed_on_hash_and_model_version(self):
+        cache_path = os.path.join(self.test_base_path, "cache.sqlite")
+        result = {
+            "detected_class": "bottle",
+            "confidence_score": 0.9,
+            "image_category": "product_display",
+            "boxes": [["bottle", 0.9, 1.0, 2.0, 30.5, 40.0], ["cup", 0.4, 5.0, 5.0, 9.0, 9.0]],
+        }
+
+        with detection_cache.DetectionCache(cache_path) as cache:
+            content_hash, _ = cache.content_hash(self.image_path)
+            cache.put(content_hash, "yolov8n.pt:abc:torch", result)
+
+        # Persisted across instances, and a different model version misses
+        with detection_cache.DetectionCache(cache_path) as cache:
+            self.assertEqual(cache.get(content_hash, "yolov8n.pt:abc:torch"), result)
+            self.assertIsNone(cache.get(content_hash, "yolov8n.pt:def:torch"))
+
+
+if __name__ == "__main__":
+    unittest.main()
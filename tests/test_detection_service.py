@@ -0,0 +1,95 @@
+import csv
+import os
+import shutil
+import sys
+import unittest
+from unittest import mock
+
+# The service imports its sibling modules the way `python src/...` runs it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+try:
+    import detection_service
+    import yolo_detect
+    HAS_DETECTION_DEPS = True
+except ImportError:
+    HAS_DETECTION_DEPS = False
+
+
+def fake_infer_images(image_paths, batch_size=None, prefetch_workers=None):
+    for img_path in image_paths:
+        yield img_path, {
+            "detected_class": "bottle",
+            "confidence_score": 0.9,
+            "image_category": "product_display",
+            "boxes": [["bottle", 0.9, 1.0, 2.0, 3.0, 4.0]],
+        }
+
+
+@unittest.skipUnless(HAS_DETECTION_DEPS, "torch, ultralytics and fastapi are required")
+class TestDetectThenRun(unittest.TestCase):
+    def setUp(self):
+        self.test_base_path = os.path.abspath("test_detection_service")
+        self.image_dir = os.path.join(self.test_base_path, "images")
+        for message_id in (100, 101, 102):
+            path = os.path.join(self.image_dir, "chanA", f"{message_id}.jpg")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(f"image {message_id}".encode())
+
+        output_csv = os.path.join(self.test_base_path, "yolo_results.csv")
+        boxes_csv = os.path.join(self.test_base_path, "yolo_boxes.csv")
+        patches = {
+            "IMAGE_DIR": self.image_dir,
+            "CACHE_PATH": os.path.join(self.test_base_path, "yolo_cache.sqlite"),
+            "OUTPUT_CSV": output_csv,
+            "BOXES_CSV": boxes_csv,
+            "PARTIAL_CSV": f"{output_csv}.part",
+            "PARTIAL_BOXES_CSV": f"{boxes_csv}.part",
+            "USE_NEAR_DUPLICATES": False,
+            "infer_images": fake_infer_images,
+            "get_model_version": lambda: "test-model",
+        }
+        for name, value in patches.items():
+            patcher = mock.patch.object(yolo_detect, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        detection_service._stats["model_version"] = "test-model"
+
+    def tearDown(self):
+        if os.path.exists(self.test_base_path):
+            shutil.rmtree(self.test_base_path)
+
+    def read_rows(self, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            return sorted((row["channel_name"], row["message_id"]) for row in csv.DictReader(f))
+
+    def test_detect_results_are_exported_by_next_run(self):
+        paths = [os.path.join(self.image_dir, "chanA", f"{i}.jpg") for i in (100, 101)]
+        response = detection_service.detect(detection_service.DetectRequest(image_paths=paths))
+        self.assertEqual(len(response["results"]), 2)
+
+        rows = yolo_detect.run_detection(batch_size=2)
+
+        # Two rows from /detect plus the one image the run inferred itself
+        self.assertEqual(rows, 1)
+        expected = [("chanA", "100"), ("chanA", "101"), ("chanA", "102")]
+        self.assertEqual(self.read_rows(yolo_detect.OUTPUT_CSV), expected)
+        self.assertEqual(self.read_rows(yolo_detect.BOXES_CSV), expected)
+        self.assertFalse(os.path.exists(yolo_detect.PARTIAL_CSV))
+
+    def test_cached_detect_results_are_not_exported_twice(self):
+        paths = [os.path.join(self.image_dir, "chanA", "100.jpg")]
+        detection_service.detect(detection_service.DetectRequest(image_paths=paths))
+        yolo_detect.run_detection(batch_size=2)
+        os.remove(yolo_detect.OUTPUT_CSV)
+        os.remove(yolo_detect.BOXES_CSV)
+
+        detection_service.detect(detection_service.DetectRequest(image_paths=paths))
+
+        # A cache hit was already exported; /detect must not queue it again
+        self.assertEqual(self.read_rows(yolo_detect.PARTIAL_CSV), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import time
+import unittest
+
+from PIL import Image
+
+from src import image_cache
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.test_base_path = "test_image_cache"
+        self.images_dir = os.path.join(self.test_base_path, "images")
+        self.cache_dir = os.path.join(self.test_base_path, "image_cache")
+        os.makedirs(os.path.join(self.images_dir, "chan"), exist_ok=True)
+        self.image_path = os.path.join(self.images_dir, "chan", "1.jpg")
+        Image.new("RGB", (1000, 500), (200, 10, 10)).save(self.image_path)
+
+    def tearDown(self):
+        if os.path.exists(self.test_base_path):
+            shutil.rmtree(self.test_base_path)
+
+    def test_letterbox_geometry(self):
+        self.assertEqual(image_cache.letterbox_geometry(1000, 500, 640), (0.64, 640, 320, 0, 160))
+        self.assertEqual(image_cache.letterbox_geometry(300, 600, 640), (640 / 600, 320, 640, 160, 0))
+
+    def test_build_variants(self):
+        paths = image_cache.build_variants(self.image_path, self.images_dir, self.cache_dir)
+        self.assertEqual(paths["detect"], os.path.join(self.cache_dir, "detect", "chan", "1.jpg"))
+
+        with Image.open(paths["detect"]) as detect:
+            self.assertEqual(detect.size, (640, 640))
+            # Padding above the image, content inside the letterboxed band
+            self.assertEqual(detect.getpixel((320, 10)), image_cache.PAD_COLOR)
+            red, _, _ = detect.getpixel((320, 320))
+            self.assertGreater(red, 150)
+        with Image.open(paths["thumbs"]) as thumb:
+            self.assertEqual(thumb.size, (256, 128))
+
+    def test_variants_rebuilt_when_original_changes(self):
+        detect_path = image_cache.ensure_detect_copy(self.image_path, self.images_dir, self.cache_dir)
+        built_at = os.path.getmtime(detect_path)
+        self.assertEqual(image_cache.ensure_detect_copy(self.image_path, self.images_dir, self.cache_dir), detect_path)
+        self.assertEqual(os.path.getmtime(detect_path), built_at)
+
+        time.sleep(0.01)
+        Image.new("RGB", (500, 1000)).save(self.image_path)
+        image_cache.ensure_detect_copy(self.image_path, self.images_dir, self.cache_dir)
+        self.assertGreater(os.path.getmtime(detect_path), built_at)
+
+    def test_images_outside_images_dir_are_not_cached(self):
+        outside = os.path.join(self.test_base_path, "other.jpg")
+        Image.new("RGB", (10, 10)).save(outside)
+        self.assertIsNone(image_cache.ensure_detect_copy(outside, self.images_dir, self.cache_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import random
+import shutil
+import unittest
+
+from PIL import Image, ImageDraw
+
+from src import image_fingerprint
+
+
+def make_image(path, seed, quality=95):
+    rng = random.Random(seed)
+    img = Image.new("RGB", (320, 240), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.randrange(300), rng.randrange(220)
+        draw.rectangle((x, y, x + rng.randrange(20, 120), y + rng.randrange(20, 120)),
+                       fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    img.save(path, quality=quality)
+
+
+class TestBKTree(unittest.TestCase):
+    def test_search_matches_brute_force(self):
+        rng = random.Random(0)
+        keys = [rng.getrandbits(64) for _ in range(500)]
+        tree = image_fingerprint.BKTree()
+        for i, key in enumerate(keys):
+            tree.add(key, i)
+        # Near variants of a stored key, plus duplicates of the same key
+        query = keys[7] ^ 0b1011
+        tree.add(keys[7], "dup")
+
+        expected = sorted(
+            (image_fingerprint.hamming(query, key), i) for i, key in enumerate(keys)
+            if image_fingerprint.hamming(query, key) <= 20
+        )
+        found = tree.search(query, 20)
+        self.assertEqual(len(tree), 501)
+        self.assertEqual([(d, v) for d, _, v in found if v != "dup"], expected)
+        self.assertEqual(found[0][0], 3)
+        self.assertIn("dup", [v for d, _, v in found if d == 3])
+
+
+class TestFingerprintStore(unittest.TestCase):
+    def setUp(self):
+        self.test_base_path = "test_image_fingerprint"
+        self.images_dir = os.path.join(self.test_base_path, "images")
+        self.store = image_fingerprint.FingerprintStore(
+            os.path.join(self.test_base_path, "fingerprints.sqlite"),
+            blob_dir=os.path.join(self.test_base_path, "blobs"),
+        )
+
+    def tearDown(self):
+        self.store.close()
+        if os.path.exists(self.test_base_path):
+            shutil.rmtree(self.test_base_path)
+
+    def path(self, channel, message_id):
+        return os.path.join(self.images_dir, channel, f"{message_id}.jpg")
+
+    def test_dhash_tolerates_recompression(self):
+        make_image(self.path("a", 1), seed=1, quality=95)
+        make_image(self.path("a", 2), seed=1, quality=40)
+        make_image(self.path("a", 3), seed=2)
+        original, recompressed, other = (image_fingerprint.dhash(self.path("a", i)) for i in (1, 2, 3))
+        self.assertLessEqual(image_fingerprint.hamming(original, recompressed), 4)
+        self.assertGreater(image_fingerprint.hamming(original, other), 10)
+        self.assertEqual(image_fingerprint.from_signed64(image_fingerprint.to_signed64(1 << 63)), 1 << 63)
+
+    def test_exact_duplicates_share_a_blob(self):
+        make_image(self.path("a", 1), seed=1)
+        os.makedirs(os.path.join(self.images_dir, "b"))
+        shutil.copyfile(self.path("a", 1), self.path("b", 9))
+
+        first = self.store.add_image("a", 1, self.path("a", 1), telegram_photo_id=555)
+        second = self.store.add_image("b", 9, self.path("b", 9))
+        self.assertEqual(first["content_hash"], second["content_hash"])
+        self.assertTrue(os.path.samefile(self.path("a", 1), self.path("b", 9)))
+        self.assertTrue(os.path.samefile(self.path("b", 9), second["blob_path"]))
+        self.assertEqual(self.store.blob_for_photo(555), first["blob_path"])
+        self.assertIsNone(self.store.blob_for_photo(556))
+        self.assertEqual(self.store.stats(), {"images": 2, "unique_contents": 1, "near_duplicate_groups": 1})
+
+    def test_near_duplicates_share_a_canonical_hash(self):
+        make_image(self.path("a", 1), seed=1, quality=95)
+        make_image(self.path("b", 2), seed=1, quality=40)
+        make_image(self.path("c", 3), seed=2)
+
+        first = self.store.add_image("a", 1, self.path("a", 1))
+        near = self.store.add_image("b", 2, self.path("b", 2))
+        other = self.store.add_image("c", 3, self.path("c", 3))
+        self.assertNotEqual(near["content_hash"], first["content_hash"])
+        self.assertEqual(near["canonical_hash"], first["content_hash"])
+        self.assertEqual(other["canonical_hash"], other["content_hash"])
+
+        # Canonical images are reloaded into the tree by a new store
+        self.store.close()
+        self.store = image_fingerprint.FingerprintStore(
+            os.path.join(self.test_base_path, "fingerprints.sqlite"),
+            blob_dir=os.path.join(self.test_base_path, "blobs"),
+        )
+        make_image(self.path("d", 4), seed=1, quality=60)
+        self.assertEqual(self.store.canonical_hash(self.path("d", 4)), first["content_hash"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import random
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+try:
+    from api import image_index
+    HAS_SQLALCHEMY = True
+except ImportError:
+    HAS_SQLALCHEMY = False
+
+from src.image_fingerprint import to_signed64
+
+T0 = datetime(2024, 1, 1)
+
+
+class FakeQuery:
+    def __init__(self, session):
+        self.session = session
+
+    def filter(self, condition):
+        # loaded_at >= :watermark
+        self.session.watermarks.append(condition.right.value)
+        return self
+
+    def all(self):
+        return self.session.rows
+
+    def yield_per(self, count):
+        return iter(self.session.rows)
+
+
+class FakeSession:
+    """Returns `rows` as (channel_name, message_id, dhash, content_hash, loaded_at)."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.watermarks = []
+
+    def query(self, *columns):
+        return FakeQuery(self)
+
+
+def row(channel_name, message_id, dhash, content_hash, minutes=0):
+    return (channel_name, message_id, to_signed64(dhash), content_hash, T0 + timedelta(minutes=minutes))
+
+
+@unittest.skipUnless(HAS_SQLALCHEMY, "sqlalchemy is required")
+class TestImageHashIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = image_index.ImageHashIndex()
+        self.index.refresh(FakeSession([
+            row("chA", 1, 0xFFFF_0000_0000_0000, "x"),
+            row("chB", 7, 0xFFFF_0000_0000_0000, "x", 1),
+            row("chB", 8, 0xFFFF_0000_0000_0001, "y", 2),
+            row("chC", 3, 0xFFFF_0000_0000_00FF, "z", 3),
+            row("chC", 4, 0x0000_FFFF_0000_0000, "w", 4),
+        ]))
+
+    def test_similar_nearest_first_without_itself(self):
+        self.assertEqual(
+            self.index.similar("chA", 1, max_distance=8, limit=10),
+            [(0, "chB", 7, True), (1, "chB", 8, False), (8, "chC", 3, False)],
+        )
+
+    def test_similar_limit_and_unknown_image(self):
+        self.assertEqual(len(self.index.similar("chA", 1, max_distance=8, limit=2)), 2)
+        self.assertIsNone(self.index.similar("chA", 99, max_distance=8, limit=10))
+
+    def test_refresh_reads_from_the_last_watermark(self):
+        session = FakeSession([row("chC", 4, 0x0000_FFFF_0000_0000, "w", 4)])
+        self.assertEqual(self.index.refresh(session), 0)
+        self.assertEqual(session.watermarks, [T0 + timedelta(minutes=4)])
+        self.assertEqual(len(self.index), 5)
+
+    def test_changed_hash_replaces_the_old_entry(self):
+        added = self.index.refresh(FakeSession([row("chB", 7, 0x0000_FFFF_0000_0001, "v", 5)]))
+        self.assertEqual(added, 1)
+        self.assertNotIn("chB", [r[1] for r in self.index.similar("chA", 1, max_distance=0, limit=10)])
+        self.assertEqual(self.index.similar("chB", 7, max_distance=1, limit=10), [(1, "chC", 4, False)])
+
+    def test_lookups_during_refresh(self):
+        rng = random.Random(0)
+        errors = []
+        stop = threading.Event()
+
+        def lookups():
+            while not stop.is_set():
+                try:
+                    self.index.similar("chA", 1, max_distance=64, limit=10_000)
+                except Exception as e:  # e.g. dictionary changed size during iteration
+                    errors.append(e)
+                    return
+
+        threads = [threading.Thread(target=lookups) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        try:
+            for batch in range(20):
+                self.index.refresh(FakeSession([
+                    row("bulk", batch * 500 + i, rng.getrandbits(64), "h", 10 + batch) for i in range(500)
+                ]))
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.index), 5 + 20 * 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import csv
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+try:
+    import load_to_postgres
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+RECORDS = [
+    (1, "chan", "2024-01-01T10:00:00", 'say "hi", then\nleave', True, None, 10, 0),
+    (2, "chan", "2024-01-01T11:00:00", "", False, "data/raw/images/chan/2.jpg", None, 3),
+    (3, "chan", "2024-01-02T09:30:00", "ሰላም, \"quoted\"\r\nline", True, None, 1.5, 0),
+]
+
+
+def read_in_chunks(stream, size):
+    parts = []
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return "".join(parts)
+        parts.append(chunk)
+
+
+class FakeCursor:
+    """Records executed SQL; fetchone() returns `results` in order."""
+
+    def __init__(self, results=()):
+        self.statements = []
+        self.rowcount = 0
+        self._results = list(results)
+
+    def execute(self, sql, params=None):
+        self.statements.append(" ".join(sql.split()))
+
+    def fetchone(self):
+        return self._results.pop(0)
+
+
+@unittest.skipUnless(HAS_PSYCOPG2, "psycopg2 is required")
+class TestCopyStream(unittest.TestCase):
+    def test_chunked_reads_match_a_single_read(self):
+        expected = load_to_postgres.CopyStream(RECORDS).read()
+        for size in (1, 2, 7, 64, 8192):
+            stream = load_to_postgres.CopyStream(RECORDS)
+            self.assertEqual(read_in_chunks(stream, size), expected, f"chunk size {size}")
+            self.assertEqual(stream.count, len(RECORDS))
+
+    def test_values_round_trip_through_csv(self):
+        text = read_in_chunks(load_to_postgres.CopyStream(RECORDS), 5)
+        rows = list(csv.reader(io.StringIO(text, newline="")))
+        self.assertEqual(len(rows), len(RECORDS))
+        self.assertEqual(rows[0][3], 'say "hi", then\nleave')
+        self.assertEqual(rows[2][3], "ሰላም, \"quoted\"\r\nline")
+        self.assertEqual([row[4] for row in rows], ["t", "f", "t"])
+
+    def test_null_and_empty_string_differ(self):
+        # COPY CSV reads an unquoted empty field as NULL and "" as an empty string
+        line = load_to_postgres.CopyStream([RECORDS[1]]).read()
+        fields = line.rstrip("\n").split(",")
+        self.assertEqual(fields[3], '""')
+        self.assertEqual(fields[6], "")
+
+
+@unittest.skipUnless(HAS_PSYCOPG2, "psycopg2 is required")
+class TestMergeStage(unittest.TestCase):
+    def merge_sql(self, cur):
+        return next(s for s in cur.statements if s.startswith(("INSERT INTO raw.telegram_messages", "WITH changed")))
+
+    def test_insert_only_merge(self):
+        cur = FakeCursor(results=[(0,)])
+        cur.rowcount = 4
+        self.assertEqual(load_to_postgres.merge_stage(cur), 4)
+        sql = self.merge_sql(cur)
+        self.assertIn("SELECT DISTINCT ON (message_id, channel_name)", sql)
+        self.assertIn("WHERE message_date IS NOT NULL", sql)
+        self.assertIn("ORDER BY message_id, channel_name, stage_seq DESC", sql)
+        self.assertIn("ON CONFLICT (message_id, channel_name, message_date) DO NOTHING", sql)
+        self.assertEqual(cur.statements[-1], "TRUNCATE telegram_messages_stage;")
+
+    def test_undated_rows_are_counted_before_the_merge(self):
+        cur = FakeCursor(results=[(2,)])
+        load_to_postgres.merge_stage(cur)
+        self.assertIn("WHERE message_date IS NULL", cur.statements[0])
+
+    def test_upsert_only_rewrites_changed_rows(self):
+        cur = FakeCursor(results=[(0,)])
+        load_to_postgres.merge_stage(cur, upsert=True)
+        sql = self.merge_sql(cur)
+        self.assertIn("DO UPDATE SET message_date = EXCLUDED.message_date", sql)
+        self.assertNotIn("message_id = EXCLUDED", sql)
+        self.assertIn("row_hash = EXCLUDED.row_hash", sql)
+        self.assertIn("WHERE raw.telegram_messages.row_hash IS DISTINCT FROM EXCLUDED.row_hash", sql)
+
+    def test_history_snapshots_changed_rows(self):
+        cur = FakeCursor(results=[(0,), (3, 3)])
+        self.assertEqual(load_to_postgres.merge_stage(cur, upsert=True, history=True), 3)
+        sql = self.merge_sql(cur)
+        self.assertTrue(sql.startswith("WITH changed AS ( INSERT INTO raw.telegram_messages"))
+        self.assertIn("RETURNING message_id, channel_name", sql)
+        self.assertIn("INSERT INTO raw.telegram_engagement_history", sql)
+        self.assertIn("JOIN changed c USING (message_id, channel_name)", sql)
+
+
+if __name__ == "__main__":
+    unittest.main()
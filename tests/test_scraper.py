@@ -0,0 +1,131 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# The scraper imports its sibling modules the way `python src/scraper.py` runs it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+try:
+    from telethon.errors import FloodWaitError
+    from telethon.tl import types
+    import scraper
+    HAS_TELETHON = True
+except ImportError:
+    HAS_TELETHON = False
+
+
+class FakeMessage:
+    def __init__(self, message_id):
+        self.id = message_id
+
+
+class FakeClient:
+    """Serves get_messages pages newest first, optionally flood-waiting once."""
+
+    def __init__(self, message_count, flood_wait_on_call=None):
+        self.message_ids = list(range(message_count, 0, -1))
+        self.calls = []
+        self.flood_wait_on_call = flood_wait_on_call
+
+    async def get_messages(self, entity, limit=None, offset_id=0, min_id=0):
+        self.calls.append({"limit": limit, "offset_id": offset_id, "min_id": min_id})
+        if len(self.calls) == self.flood_wait_on_call:
+            raise FloodWaitError(request=None, capture=0)
+        ids = [i for i in self.message_ids if i > min_id and (not offset_id or i < offset_id)]
+        return [FakeMessage(i) for i in ids[:limit]]
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self, cost=1):
+        self.acquired += cost
+
+
+async def collect(client, limiter, **kwargs):
+    return [m.id async for m in scraper.iter_channel_messages(client, "entity", limiter, **kwargs)]
+
+
+@unittest.skipUnless(HAS_TELETHON, "telethon is required")
+class TestRateLimiter(unittest.TestCase):
+    def time_acquires(self, limiter, costs):
+        async def run():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            for cost in costs:
+                await limiter.acquire(cost)
+            return loop.time() - start
+        return asyncio.run(run())
+
+    def test_burst_is_free(self):
+        limiter = scraper.RateLimiter(rate=10, burst=5)
+        self.assertLess(self.time_acquires(limiter, [1] * 5), 0.05)
+
+    def test_refill_rate_after_burst(self):
+        # 5 from the burst, then 5 more at 50 per second
+        limiter = scraper.RateLimiter(rate=50, burst=5)
+        elapsed = self.time_acquires(limiter, [1] * 10)
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertLess(elapsed, 0.5)
+
+    def test_cost_above_burst_leaves_debt(self):
+        limiter = scraper.RateLimiter(rate=50, burst=5)
+        # 8 tokens go through on a full bucket, leaving 3 owed
+        self.assertLess(self.time_acquires(limiter, [8]), 0.05)
+        # The next token waits for the debt plus itself: 4 / 50 s
+        elapsed = self.time_acquires(limiter, [1])
+        self.assertGreaterEqual(elapsed, 0.07)
+        self.assertLess(elapsed, 0.5)
+
+
+@unittest.skipUnless(HAS_TELETHON, "telethon is required")
+class TestIterChannelMessages(unittest.TestCase):
+    def test_pages_with_one_token_per_page(self):
+        client, limiter = FakeClient(250), CountingLimiter()
+        ids = asyncio.run(collect(client, limiter))
+        self.assertEqual(ids, list(range(250, 0, -1)))
+        self.assertEqual([c["offset_id"] for c in client.calls], [0, 151, 51])
+        self.assertEqual(limiter.acquired, len(client.calls))
+
+    def test_limit_shrinks_last_page(self):
+        client, limiter = FakeClient(250), CountingLimiter()
+        ids = asyncio.run(collect(client, limiter, limit=150))
+        self.assertEqual(len(ids), 150)
+        self.assertEqual([c["limit"] for c in client.calls], [100, 50])
+
+    def test_min_id_stops_on_short_page(self):
+        client, limiter = FakeClient(250), CountingLimiter()
+        ids = asyncio.run(collect(client, limiter, min_id=240))
+        self.assertEqual(ids, list(range(250, 240, -1)))
+        self.assertEqual(len(client.calls), 1)
+
+    def test_flood_wait_retries_only_that_page(self):
+        client, limiter = FakeClient(250, flood_wait_on_call=2), CountingLimiter()
+        ids = asyncio.run(collect(client, limiter))
+        self.assertEqual(ids, list(range(250, 0, -1)))
+        self.assertEqual([c["offset_id"] for c in client.calls], [0, 151, 151, 51])
+        self.assertEqual(limiter.acquired, 4)
+
+
+@unittest.skipUnless(HAS_TELETHON, "telethon is required")
+class TestPhotoRequestCount(unittest.TestCase):
+    def test_largest_size_in_128kb_parts(self):
+        photo = types.Photo(
+            id=1, access_hash=0, file_reference=b"", date=None, dc_id=2,
+            sizes=[
+                types.PhotoStrippedSize("i", b"xx"),
+                types.PhotoSize("m", 320, 320, 20000),
+                types.PhotoSizeProgressive("y", 1280, 1280, [10000, 90000, 300000]),
+            ],
+        )
+        self.assertEqual(scraper.photo_request_count(types.MessageMediaPhoto(photo=photo)), 3)
+
+    def test_unknown_size_costs_one(self):
+        media = types.MessageMediaPhoto(photo=types.PhotoEmpty(id=1))
+        self.assertEqual(scraper.photo_request_count(media), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
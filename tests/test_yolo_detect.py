@@ -0,0 +1,80 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# yolo_detect imports its sibling modules the way `python src/yolo_detect.py` runs it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+try:
+    import yolo_detect
+    HAS_DETECTION_DEPS = True
+except ImportError:
+    HAS_DETECTION_DEPS = False
+
+SHAPES = {"a": (480, 640, 3), "b": (640, 480, 3), "c": (333, 500, 3)}
+
+
+def decoded(spec):
+    """(img_path, (image, None)) items from e.g. "aab!c"; '!' is an undecodable image."""
+    for i, kind in enumerate(spec):
+        if kind == "!":
+            yield f"{i}.jpg", ValueError("image could not be decoded")
+        else:
+            yield f"{i}{kind}.jpg", (np.zeros(SHAPES[kind], dtype=np.uint8), None)
+
+
+def batch_paths(batches):
+    return [[path for path, _ in batch] for batch in batches]
+
+
+@unittest.skipUnless(HAS_DETECTION_DEPS, "torch and ultralytics are required")
+class TestIterImageBatches(unittest.TestCase):
+    def test_batches_share_one_shape(self):
+        batches = list(yolo_detect.iter_image_batches(decoded("abab" * 3), batch_size=3, max_buffered=100))
+        for batch in batches:
+            self.assertEqual(len({item[0].shape for _, item in batch}), 1)
+        self.assertEqual(batch_paths(batches)[:2], [["0a.jpg", "2a.jpg", "4a.jpg"], ["1b.jpg", "3b.jpg", "5b.jpg"]])
+        self.assertEqual(sorted(p for b in batch_paths(batches) for p in b), sorted(p for p, _ in decoded("abab" * 3)))
+
+    def test_errors_pass_through_alone(self):
+        batches = list(yolo_detect.iter_image_batches(decoded("a!a"), batch_size=2, max_buffered=100))
+        self.assertEqual(batch_paths(batches), [["1.jpg"], ["0a.jpg", "2a.jpg"]])
+        self.assertIsInstance(batches[0][0][1], ValueError)
+
+    def test_leftover_buckets_flush_at_the_end(self):
+        batches = list(yolo_detect.iter_image_batches(decoded("abc"), batch_size=4, max_buffered=100))
+        self.assertEqual(batch_paths(batches), [["0a.jpg"], ["1b.jpg"], ["2c.jpg"]])
+
+    def test_buffer_cap_flushes_the_fullest_bucket(self):
+        batches = list(yolo_detect.iter_image_batches(decoded("abbcb"), batch_size=3, max_buffered=3))
+        # At 3 buffered b is fullest; at the next 3 every bucket holds one and a is oldest
+        self.assertEqual(batch_paths(batches), [["1b.jpg", "2b.jpg"], ["0a.jpg"], ["3c.jpg"], ["4b.jpg"]])
+
+    def test_buffer_cap_flushes_the_oldest_on_ties(self):
+        batches = list(yolo_detect.iter_image_batches(decoded("abab"), batch_size=4, max_buffered=4))
+        self.assertEqual(batch_paths(batches)[0], ["0a.jpg", "2a.jpg"])
+
+    def test_never_buffers_more_than_the_cap(self):
+        spec = "abcabcaabbccabcabc" * 4
+        consumed = []
+
+        def counting():
+            for item in decoded(spec):
+                consumed.append(item[0])
+                yield item
+
+        yielded = 0
+        for batch in yolo_detect.iter_image_batches(counting(), batch_size=4, max_buffered=5):
+            self.assertLessEqual(len(consumed) - yielded, 5)
+            yielded += len(batch)
+        self.assertEqual(yielded, len(spec))
+
+    def test_cap_is_at_least_one_batch(self):
+        batches = list(yolo_detect.iter_image_batches(decoded("aaab"), batch_size=3, max_buffered=1))
+        self.assertEqual(batch_paths(batches)[0], ["0a.jpg", "1a.jpg", "2a.jpg"])
+
+
+if __name__ == "__main__":
+    unittest.main()